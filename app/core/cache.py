@@ -0,0 +1,52 @@
+# app/core/cache.py
+import threading
+import time
+from collections import OrderedDict
+from app.core.metrics import record_cache
+
+class TTLCache:
+    """A small thread-safe LRU cache whose entries expire after a time-to-live."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0, name: str | None = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None: del self._data[key]
+                self.misses += 1
+                if self.name: record_cache(self.name, hit=False)
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            if self.name: record_cache(self.name, hit=True)
+            return entry[1]
+
+    def set(self, key, value, ttl: float | None = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0: return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard_where(self, predicate):
+        """Removes every entry whose value matches the predicate."""
+        with self._lock:
+            for key in [k for k, (_, v) in self._data.items() if predicate(v)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
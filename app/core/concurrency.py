@@ -0,0 +1,146 @@
+# app/core/concurrency.py
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque, defaultdict
+from contextlib import asynccontextmanager
+from app.core.metrics import Counter, Gauge, Histogram
+
+COALESCED_REQUESTS = Counter("insightgpt_coalesced_requests_total", "Requests that joined an identical in-flight execution instead of running their own.")
+LLM_INFLIGHT = Gauge("insightgpt_llm_inflight", "LLM-backed executions currently holding an admission slot.")
+LLM_QUEUE_DEPTH = Gauge("insightgpt_llm_queue_depth", "LLM-backed executions waiting for an admission slot.")
+LLM_QUEUE_WAIT = Histogram("insightgpt_llm_queue_wait_seconds", "Time spent waiting for an LLM admission slot.")
+ADMISSION_REJECTED = Counter("insightgpt_llm_admission_rejected_total", "Requests rejected by LLM admission control.", ["reason"])
+
+class SingleFlight:
+    """Coalesces identical concurrent calls so they share one execution and its result."""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, factory, private_errors: tuple = ()):
+        """
+        Runs factory() or joins the identical call already in flight. Errors of a type in private_errors
+        belong to the caller that started the flight (e.g. its own admission rejection): they are raised
+        only to that caller, and callers that joined retry with their own factory instead.
+        """
+        while True:
+            task = self._inflight.get(key)
+            leader = task is None
+            if leader:
+                task = asyncio.ensure_future(factory())
+                self._inflight[key] = task
+                task.add_done_callback(lambda done: self._inflight.pop(key, None) if self._inflight.get(key) is done else None)
+            else:
+                COALESCED_REQUESTS.inc()
+            try:
+                # Shielded so one caller disconnecting does not cancel the work the others are waiting on.
+                return await asyncio.shield(task)
+            except private_errors:
+                if leader: raise
+
+class AdmissionRejected(Exception):
+    """Raised when the LLM wait queue or a user's fair share is exhausted."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class LLMAdmission:
+    """
+    Bounds concurrent LLM-backed executions. Callers beyond the limit wait in a bounded queue; when a
+    slot frees up it goes to the waiting user with the fewest running executions, so one user's burst
+    cannot starve everyone else. Each user may also hold only a limited number of running or queued calls.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int, per_user: int):
+        self.max_concurrent, self.max_queue, self.per_user = max_concurrent, max_queue, per_user
+        self._running = 0
+        self._running_by_user = defaultdict(int)
+        self._waiters = OrderedDict()
+        self._queued = 0
+        self._avg_service_time = 5.0
+
+    def _pending_for(self, user: str) -> int:
+        return self._running_by_user.get(user, 0) + len(self._waiters.get(user, ()))
+
+    def retry_after(self) -> int:
+        """A rough estimate of how long until a queued call would get a slot."""
+        return max(1, math.ceil((self._queued + 1) / self.max_concurrent * self._avg_service_time))
+
+    def check_capacity(self):
+        if self._queued >= self.max_queue:
+            ADMISSION_REJECTED.inc(reason="queue_full")
+            raise AdmissionRejected("queue_full", self.retry_after())
+
+    def _grant(self, user: str):
+        self._running += 1
+        self._running_by_user[user] += 1
+        LLM_INFLIGHT.set(self._running)
+
+    async def acquire(self, user: str, bounded: bool = True):
+        if bounded and self._pending_for(user) >= self.per_user:
+            ADMISSION_REJECTED.inc(reason="user_quota")
+            raise AdmissionRejected("user_quota", self.retry_after())
+        if self._running < self.max_concurrent and not self._queued:
+            self._grant(user)
+            return
+        if bounded: self.check_capacity()
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(user, deque()).append(waiter)
+        self._queued += 1
+        LLM_QUEUE_DEPTH.set(self._queued)
+        start = time.perf_counter()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled(): self.release(user)
+            else: self._remove_waiter(user, waiter)
+            raise
+        finally:
+            LLM_QUEUE_WAIT.observe(time.perf_counter() - start)
+
+    def _remove_waiter(self, user: str, waiter):
+        queue = self._waiters.get(user)
+        if queue and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue: del self._waiters[user]
+            LLM_QUEUE_DEPTH.set(self._queued)
+
+    def release(self, user: str):
+        self._running -= 1
+        self._running_by_user[user] -= 1
+        if not self._running_by_user[user]: del self._running_by_user[user]
+        while self._waiters and self._running < self.max_concurrent:
+            # Fair share: the waiting user with the fewest running executions goes next, oldest first on ties.
+            next_user = min(self._waiters, key=lambda u: self._running_by_user.get(u, 0))
+            queue = self._waiters[next_user]
+            waiter = queue.popleft()
+            if not queue: del self._waiters[next_user]
+            self._queued -= 1
+            if waiter.cancelled(): continue
+            self._grant(next_user)
+            waiter.set_result(None)
+        LLM_QUEUE_DEPTH.set(self._queued)
+        LLM_INFLIGHT.set(self._running)
+
+    @asynccontextmanager
+    async def slot(self, user: str, bounded: bool = True):
+        await self.acquire(user, bounded=bounded)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._avg_service_time = 0.9 * self._avg_service_time + 0.1 * (time.perf_counter() - start)
+            self.release(user)
+
+query_coalescer = SingleFlight()
+llm_admission = LLMAdmission(
+    max_concurrent=int(os.getenv("LLM_MAX_CONCURRENT", 8)),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", 64)),
+    per_user=int(os.getenv("LLM_USER_MAX_PENDING", 4)),
+)
@@ -3,7 +3,7 @@ from sqlalchemy import create_engine
 import os
 
 DB_FILE_PATH = os.path.join('data', 'analytics.db')
-DATABASE_URL = f"sqlite:///{DB_FILE_PATH}"
+DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DB_FILE_PATH}")
 
 # Create a single, reusable engine
 engine = create_engine(
@@ -0,0 +1,128 @@
+# app/core/metrics.py
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger("insightgpt.metrics")
+
+# Trace id of the request being served, set by the HTTP middleware in app.main.
+trace_id_var: ContextVar[str | None] = ContextVar("trace_id", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs: return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Gauge(Counter):
+    """A value per label set that can go up and down."""
+
+    def set(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+class Histogram:
+    """Cumulative bucketed observations per label set, in Prometheus histogram layout."""
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+# --- Application metrics ---
+STAGE_LATENCY = Histogram("insightgpt_stage_latency_seconds", "Latency of pipeline stages (graph nodes, LLM calls, tools, rendering).", ["stage"])
+STAGE_ERRORS = Counter("insightgpt_stage_errors_total", "Pipeline stages that raised an exception.", ["stage"])
+LLM_TOKENS = Counter("insightgpt_llm_tokens_total", "LLM tokens consumed, split into prompt and completion.", ["kind"])
+CACHE_REQUESTS = Counter("insightgpt_cache_requests_total", "Cache lookups by cache and result (hit or miss).", ["cache", "result"])
+ROUTING_DECISIONS = Counter("insightgpt_routing_decisions_total", "Router decisions by chosen route.", ["route"])
+PARALLEL_OUTCOMES = Counter("insightgpt_parallel_outcomes_total", "Outcome of speculative SQL+RAG runs (a source won early, only one was useful, or merged).", ["outcome"])
+HTTP_LATENCY = Histogram("insightgpt_http_request_duration_seconds", "HTTP request latency by route and status.", ["method", "path", "status"])
+
+@contextmanager
+def timed(stage: str):
+    """Records the latency of a block (or decorated function) under the given stage, counting failures."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage=stage)
+        logger.debug("stage=%s duration_ms=%.1f trace_id=%s", stage, elapsed * 1000, trace_id_var.get())
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+def render_metrics() -> str:
+    """Renders every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
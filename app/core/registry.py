@@ -0,0 +1,62 @@
+# app/core/registry.py
+import threading
+import time
+from app.core.metrics import timed
+
+_UNSET = object()
+
+class ServiceRegistry:
+    """
+    Builds heavy components (LLM clients, SQL agent, embeddings, vector index, Redis) on first
+    use instead of at import time, and warms the ones marked for warmup during startup.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._warm = []
+        self.status = {}
+        self.ready = False
+
+    def register(self, name: str, factory, warm: bool = False, required: bool = True):
+        """Registers a zero-argument factory. Warm components are built by warmup(); optional ones may fail without blocking readiness."""
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+        if warm: self._warm.append((name, required))
+
+    def get(self, name: str):
+        instance = self._instances.get(name, _UNSET)
+        if instance is not _UNSET: return instance
+        with self._locks[name]:
+            instance = self._instances.get(name, _UNSET)
+            if instance is _UNSET:
+                with timed(f"init:{name}"):
+                    instance = self._factories[name]()
+                self._instances[name] = instance
+        return instance
+
+    def override(self, name: str, instance):
+        """Replaces a component, e.g. with a fake in benchmarks."""
+        self._instances[name] = instance
+
+    def reset(self, name: str):
+        """Forgets a built component so the next get() rebuilds it."""
+        self._instances.pop(name, None)
+
+    def warmup(self) -> dict:
+        """Builds every warm component in registration order and marks the registry ready if all required ones succeeded."""
+        failed_required = False
+        for name, required in self._warm:
+            start = time.perf_counter()
+            try:
+                self.get(name)
+                self.status[name] = {"status": "ok", "seconds": round(time.perf_counter() - start, 3)}
+            except Exception as e:
+                print(f"⚠️ Warmup of '{name}' failed: {e}")
+                self.status[name] = {"status": "failed", "error": str(e)}
+                failed_required = failed_required or required
+        self.ready = not failed_required
+        return self.status
+
+registry = ServiceRegistry()
@@ -1,16 +1,31 @@
 from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+import asyncio
+import threading
 import os
 
 # --- Configuration ---
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# When enabled, a signed token carrying a "uid" claim is trusted without a database lookup.
+TRUST_TOKEN_CLAIMS = os.getenv("TRUST_TOKEN_CLAIMS", "false").lower() == "true"
 
 # Password Hashing context
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt is deliberately slow, so it runs on its own bounded pool instead of the event loop.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_pending_password_ops = 0
+_pending_lock = threading.Lock()
+
+class PasswordHashingBusy(Exception):
+    """Raised when too many password operations are already queued."""
+
 # --- Functions ---
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -21,6 +36,25 @@ def get_password_hash(password: str) -> str:
     """Hashes a plain password."""
     return pwd_context.hash(password)
 
+async def _run_password_op(func, *args):
+    """Runs a password operation on the dedicated pool, rejecting it when the queue is full."""
+    global _pending_password_ops
+    with _pending_lock:
+        if _pending_password_ops >= PASSWORD_HASH_MAX_PENDING: raise PasswordHashingBusy()
+        _pending_password_ops += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+    finally:
+        with _pending_lock: _pending_password_ops -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verifies a password off the event loop."""
+    return await _run_password_op(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hashes a password off the event loop."""
+    return await _run_password_op(get_password_hash, password)
+
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
     """Creates a new JWT access token."""
     to_encode = data.copy()
@@ -1,22 +1,40 @@
 # app/main.py
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from jose import JWTError, jwt
+from contextlib import asynccontextmanager
 from typing import Annotated, Optional, List, Dict, Any
 from sqlalchemy.orm import Session
-import json, re, os, io, shutil, uuid
+import json, re, os, io, shutil, uuid, time, asyncio
 
-from app.core.database import get_db
+from app.core.database import get_db, engine
 from app.services import agent_service, user_service, viz_service, report_service, rag_service, redis_service
 from app.schemas.user import UserCreate, Token, TokenData, UserInDB
-from app.core.security import verify_password, create_access_token, SECRET_KEY, ALGORITHM
+from app.core.registry import registry
+from app.core.concurrency import query_coalescer, llm_admission, AdmissionRejected
+from app.core.metrics import HTTP_LATENCY, trace_id_var, new_trace_id, render_metrics
+from app.core.security import verify_password_async, get_password_hash_async, PasswordHashingBusy, create_access_token, SECRET_KEY, ALGORITHM, TRUST_TOKEN_CLAIMS
 
-app = FastAPI(title="InsightGPT Pro API", version="1.0.0")
-agent_executor = agent_service.create_agent()
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background so "/" answers immediately while "/ready" reports progress.
+    if STARTUP_WARMUP: app.state.warmup_task = asyncio.create_task(asyncio.to_thread(registry.warmup))
+    else: registry.ready = True
+    yield
+
+app = FastAPI(title="InsightGPT Pro API", version="1.0.0", lifespan=lifespan)
+TRACE_HEADER = os.getenv("TRACE_HEADER", "X-Trace-Id")
+ENABLE_TRACE_ID = os.getenv("ENABLE_TRACE_ID", "true").lower() == "true"
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 100))
 
 class QueryRequest(BaseModel): query: str
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    max_parallel: Optional[int] = None
 class QueryResponse(BaseModel):
     answer: str
     chart_json: Optional[str] = None
@@ -26,29 +44,59 @@ class SessionCreationResponse(BaseModel): session_id: str
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    trace_id = request.headers.get(TRACE_HEADER) or new_trace_id()
+    token = trace_id_var.set(trace_id)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        trace_id_var.reset(token)
+    route = request.scope.get("route")
+    HTTP_LATENCY.observe(time.perf_counter() - start, method=request.method, path=getattr(route, "path", "unmatched"), status=response.status_code)
+    if ENABLE_TRACE_ID: response.headers[TRACE_HEADER] = trace_id
+    return response
+
+@app.exception_handler(PasswordHashingBusy)
+async def password_hashing_busy_handler(request: Request, exc: PasswordHashingBusy):
+    return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"detail": "Too many login attempts in progress. Please retry shortly."}, headers={"Retry-After": "1"})
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(status_code=status.HTTP_429_TOO_MANY_REQUESTS, content={"detail": f"Too many queries in progress ({exc.reason}). Please retry shortly."}, headers={"Retry-After": str(exc.retry_after)})
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+    cached_user = user_service.get_cached_user(token)
+    if cached_user is not None: return cached_user
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub");
         if username is None: raise credentials_exception
     except JWTError: raise credentials_exception
-    if username.startswith("guest_"): return UserInDB(id=0, username=username, hashed_password="")
-    user = user_service.get_user(db=db, username=username);
-    if user is None: raise credentials_exception
+    if username.startswith("guest_"): user = UserInDB(id=0, username=username, hashed_password="")
+    elif TRUST_TOKEN_CLAIMS and payload.get("uid") is not None: user = UserInDB(id=payload["uid"], username=username, hashed_password="")
+    else:
+        # Only cache misses open a connection; the lookup just confirms the user still exists.
+        with engine.connect() as db: user = user_service.get_user(db=db, username=username);
+        if user is None: raise credentials_exception
+    user_service.cache_user(token, user, expires_at=payload.get("exp"))
     return user
 
 @app.post("/register", response_model=UserInDB, status_code=status.HTTP_201_CREATED, tags=["Authentication"])
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = user_service.get_user(db=db, username=user.username);
+async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+    # Async only to await the hash executor; the blocking database calls still run off the event loop.
+    db_user = await asyncio.to_thread(user_service.get_user, db=db, username=user.username)
     if db_user: raise HTTPException(status_code=400, detail="Username already registered")
-    return user_service.create_user(db=db, user=user)
+    hashed_password = await get_password_hash_async(user.password)
+    return await asyncio.to_thread(user_service.create_user, db=db, user=user, hashed_password=hashed_password)
 
 @app.post("/token", response_model=Token, tags=["Authentication"])
 async def login_for_access_token(form_data: Annotated[OAuth2PasswordRequestForm, Depends()], db: Session = Depends(get_db)):
-    user = user_service.get_user(db=db, username=form_data.username);
-    if not user or not verify_password(form_data.password, user.hashed_password): raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password", headers={"WWW-Authenticate": "Bearer"})
-    access_token = create_access_token(data={"sub": user.username});
+    user = await asyncio.to_thread(user_service.get_user, db=db, username=form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password): raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password", headers={"WWW-Authenticate": "Bearer"})
+    access_token = create_access_token(data={"sub": user.username, "uid": user.id});
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/guest-token", response_model=Token, tags=["Authentication"])
@@ -102,9 +150,7 @@ async def generate_report_endpoint(request: ReportRequest, current_user: Annotat
         return StreamingResponse(io.BytesIO(pdf_bytes), media_type="application/pdf", headers={"Content-Disposition": "attachment;filename=InsightGPT_Report.pdf"})
     except Exception as e: raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
 
-@app.post("/query", response_model=QueryResponse, tags=["Query"])
-async def handle_query(request: QueryRequest, current_user: Annotated[UserInDB, Depends(get_current_user)]):
-    agent_response = agent_service.run_query(request.query)
+def build_query_response(agent_response: str) -> QueryResponse:
     chart_json, answer_text = None, agent_response
     json_match = re.search(r"\{.*\}", agent_response, re.DOTALL)
     if json_match:
@@ -119,5 +165,34 @@ async def handle_query(request: QueryRequest, current_user: Annotated[UserInDB,
         except (json.JSONDecodeError, TypeError): pass
     return QueryResponse(answer=answer_text, chart_json=chart_json)
 
+@app.post("/query", response_model=QueryResponse, tags=["Query"])
+async def handle_query(request: QueryRequest, current_user: Annotated[UserInDB, Depends(get_current_user)]):
+    async def execute():
+        async with llm_admission.slot(current_user.username):
+            return await asyncio.to_thread(agent_service.run_query, request.query)
+    # Identical questions asked concurrently share one agent run (answers do not depend on the user).
+    # A leader's admission rejection (its quota, not ours) is not shared: joiners retry under their own identity.
+    agent_response = await query_coalescer.run(" ".join(request.query.lower().split()), execute, private_errors=(AdmissionRejected,))
+    return build_query_response(agent_response)
+
+@app.post("/query/batch", tags=["Query"])
+async def handle_query_batch(request: BatchQueryRequest, current_user: Annotated[UserInDB, Depends(get_current_user)]):
+    if not request.queries: raise HTTPException(status_code=400, detail="No queries provided.")
+    if len(request.queries) > BATCH_MAX_QUERIES: raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUERIES} queries per batch.")
+    llm_admission.check_capacity()
+    async def stream_results():
+        # One JSON object per line, in completion order rather than request order.
+        async for index, agent_response in agent_service.stream_batch(request.queries, request.max_parallel, admission=lambda: llm_admission.slot(current_user.username, bounded=False)):
+            response = await asyncio.to_thread(build_query_response, agent_response)
+            yield json.dumps({"index": index, "query": request.queries[index], **response.model_dump()}) + "\n"
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Health Check"])
+async def metrics(): return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready", tags=["Health Check"])
+async def readiness():
+    return JSONResponse(status_code=200 if registry.ready else 503, content={"ready": registry.ready, "components": registry.status})
+
 @app.get("/", tags=["Health Check"])
 async def root(): return {"status": "ok", "message": "InsightGPT Pro API is running."}
\ No newline at end of file
@@ -1,107 +1,262 @@
 # app/services/agent_service.py
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.agent_toolkits import create_sql_agent
-from langchain.tools import Tool
-from langchain_community.utilities.sql_database import SQLDatabase
 from typing import TypedDict, Literal
-from langgraph.graph import StateGraph, END
-from langchain_core.prompts import ChatPromptTemplate
-from langchain.agents import AgentExecutor, create_tool_calling_agent
-from app.services import rag_service
+from app.services import rag_service, context_service
 from app.core.database import DATABASE_URL
+from app.core.metrics import timed, ROUTING_DECISIONS, PARALLEL_OUTCOMES
+from app.core.registry import registry
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, wait
+import asyncio
+import contextlib
+import contextvars
+import threading
+import os
+import re
 
 load_dotenv()
 
-# --- Define Tools (No change here) ---
-llm = ChatGoogleGenerativeAI(model="gemini-pro-latest", temperature=0, convert_system_message_to_human=True)
-db = SQLDatabase.from_uri(DATABASE_URL)
-sql_agent_executor = create_sql_agent(llm=llm, db=db, agent_type="openai-tools", verbose=False)
-sql_tool = Tool(name="SQLDatabase", func=sql_agent_executor.invoke, description="Use this tool to answer questions about structured sales data like sales, regions, products, revenue, etc.")
-rag_tool = Tool(name="FinancialReportSearch", func=rag_service.query_rag, description="Use this tool to answer questions about the Q3 2025 financial report or any other uploaded document/summary.")
+# "gemini" talks to Google; "fake" uses the scripted offline model for load tests and benchmarks.
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+
+# Below this router confidence (or when the router answers BOTH) SQL and RAG run concurrently.
+ENABLE_PARALLEL_ROUTING = os.getenv("ENABLE_PARALLEL_ROUTING", "true").lower() == "true"
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", 0.7))
+_worker_pool = ThreadPoolExecutor(max_workers=int(os.getenv("PARALLEL_WORKERS", 8)), thread_name_prefix="agent-worker")
+
+# Batch queries share identical retrievals, SQL results and whole answers through this memo.
+BATCH_MAX_PARALLEL = int(os.getenv("BATCH_MAX_PARALLEL", 4))
+_batch_memo: contextvars.ContextVar[dict | None] = contextvars.ContextVar("batch_memo", default=None)
+
+def _memoized(kind: str, key, compute):
+    """Computes a value once per batch for a given key; outside a batch it just computes it."""
+    memo = _batch_memo.get()
+    if memo is None: return compute()
+    with memo["lock"]:
+        future = memo["entries"].get((kind, key))
+        owner = future is None
+        if owner: future = memo["entries"][(kind, key)] = Future()
+    if owner:
+        try:
+            future.set_result(compute())
+        except WorkerCancelled as e:
+            # A cancelled speculative worker has no value to share; forget the entry so the next caller computes it.
+            with memo["lock"]:
+                if memo["entries"].get((kind, key)) is future: del memo["entries"][(kind, key)]
+            future.set_exception(e)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+    try:
+        return future.result()
+    except WorkerCancelled:
+        if owner: raise
+        return _memoized(kind, key, compute)
+
+# Heavy LangChain/LangGraph objects are built on first use (or during startup warmup) via the registry.
+def build_llm(provider: str = LLM_PROVIDER):
+    """Builds the chat model for the given provider."""
+    if provider == "fake":
+        from app.services.fake_llm import ScriptedChatModel
+        return ScriptedChatModel(latency=float(os.getenv("FAKE_LLM_LATENCY_MS", 50)) / 1000)
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model="gemini-pro-latest", temperature=0, convert_system_message_to_human=True)
+
+def _with_metrics(model):
+    from app.services.llm_metrics import llm_metrics_callback
+    if llm_metrics_callback not in (model.callbacks or []): model.callbacks = [*(model.callbacks or []), llm_metrics_callback]
+    return model
 
-tools = [sql_tool, rag_tool]
+def configure_llm(new_llm):
+    """Swaps the chat model used by every node and rebuilds the SQL agent around it."""
+    registry.override("llm", _with_metrics(new_llm))
+    registry.reset("sql_agent")
+
+def get_llm():
+    return registry.get("llm")
+
+def _build_sql_database():
+    from langchain_community.utilities.sql_database import SQLDatabase
+    db = SQLDatabase.from_uri(DATABASE_URL)
+    db.get_usable_table_names()
+    # Identical SQL issued by different questions in one batch runs only once.
+    run = db.run
+    db.run = lambda command, *args, **kwargs: _memoized("sql", (command, args, tuple(sorted(kwargs.items()))), lambda: run(command, *args, **kwargs))
+    return db
+
+def _build_sql_agent():
+    from langchain_community.agent_toolkits import create_sql_agent
+    return create_sql_agent(llm=get_llm(), db=registry.get("sql_database"), agent_type="openai-tools", verbose=False)
+
+def run_sql_agent(query):
+    with timed("sql_tool"):
+        return _memoized("sql_tool", str(query), lambda: registry.get("sql_agent").invoke(query))
+
+# --- Define Tools (No change here) ---
+def _build_tools():
+    from langchain.tools import Tool
+    sql_tool = Tool(name="SQLDatabase", func=run_sql_agent, description="Use this tool to answer questions about structured sales data like sales, regions, products, revenue, etc.")
+    rag_tool = Tool(name="FinancialReportSearch", func=rag_service.query_rag, description="Use this tool to answer questions about the Q3 2025 financial report or any other uploaded document/summary.")
+    return {"sql": sql_tool, "rag": rag_tool}
 
 # --- Define the Agent State (No change here) ---
 class AgentState(TypedDict):
     input: str
     context: str
     result: str
+    route: str
+    preferred: str
+    source: str
 
-# --- Define the Router (No change here) ---
-def router(state: AgentState) -> Literal["sql_node", "rag_node"]:
+# --- Define the Router ---
+@timed("router")
+def router_node(state: AgentState) -> dict:
     print("---ROUTER---")
+    if state.get("route"): return {"route": state["route"], "preferred": state.get("preferred", "")}
     router_prompt = f"""Based on the user's question, decide which tool is the most appropriate to use.
     Your options are:
     - 'SQLDatabase': For questions about sales, revenue, products, and regions in the database.
     - 'FinancialReportSearch': For questions about financial reports, CEO statements, or uploaded summaries/documents.
+    - 'BOTH': For questions that need the database and the documents together, e.g. comparing the report with the sales data.
 
     User Question: "{state['input']}"
 
-    Respond with ONLY the name of the tool to use.
+    Respond with ONLY the name of the option followed by your confidence between 0 and 1, e.g. "SQLDatabase 0.9".
     """
-    router_response = llm.invoke(router_prompt)
+    route, preferred = _parse_route(get_llm().invoke(router_prompt).content)
+    return {"route": route, "preferred": preferred}
 
-    if "sql" in router_response.content.lower():
-        print("Routing to SQL node.")
-        return "sql_node"
-    else:
-        print("Routing to RAG node.")
-        return "rag_node"
+def _parse_route(answer: str) -> tuple[str, str]:
+    """Turns a router answer like "SQLDatabase 0.9" into a graph route and the source it leans towards."""
+    answer = answer.lower()
+    confidence_match = re.search(r"\b(0(?:\.\d+)?|1(?:\.0+)?)\b", answer)
+    confidence = float(confidence_match.group(1)) if confidence_match else 1.0
+
+    if "both" in answer: route, preferred = "parallel_node", ""
+    elif "sql" in answer: route, preferred = "sql_node", "sql"
+    else: route, preferred = "rag_node", "rag"
+    if route != "parallel_node" and confidence < ROUTER_CONFIDENCE_THRESHOLD: route = "parallel_node"
+    if route == "parallel_node" and not ENABLE_PARALLEL_ROUTING: route = "rag_node" if preferred == "rag" else "sql_node"
+    print(f"Routing to {route} (confidence {confidence:.2f}).")
+    ROUTING_DECISIONS.inc(route=route)
+    return route, preferred
 
 # --- Define Worker and Generation Nodes ---
-prompt = ChatPromptTemplate.from_messages([
-    ("system", """
-    You are a helpful data analyst assistant. You have access to a SQL database and a document search tool.
-
-    IMPORTANT: If the user asks for a visualization like a 'chart' or 'plot', first use the SQL tool to get the necessary data. Then, you MUST format your final response as a single JSON object.
-
-    For a BAR CHART, the JSON should look like this:
-    {{
-      "comment": "Here is a bar chart showing the total revenue by region.",
-      "chart_details": {{
-        "type": "bar",
-        "x_col": "region",
-        "y_col": "total_revenue",
-        "title": "Total Revenue by Region"
-      }},
-      "data": [ {{"region": "North", "total_revenue": 867.5}}, ... ]
-    }}
-
-    For a PIE CHART, the JSON should look like this:
-    {{
-      "comment": "Here is a pie chart showing the revenue distribution by product.",
-      "chart_details": {{
-        "type": "pie",
-        "names_col": "product",
-        "values_col": "total_revenue",
-        "title": "Revenue Distribution by Product"
-      }},
-      "data": [ {{"product": "Widget A", "total_revenue": 1130.0}}, ... ]
-    }}
-
-    If the user asks a regular question, just answer in natural language.
-    """),
-    ("human", "{input}"),
-    ("placeholder", "{agent_scratchpad}"),
-])
+def _build_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([
+        ("system", """
+        You are a helpful data analyst assistant. You have access to a SQL database and a document search tool.
+
+        IMPORTANT: If the user asks for a visualization like a 'chart' or 'plot', first use the SQL tool to get the necessary data. Then, you MUST format your final response as a single JSON object.
+
+        For a BAR CHART, the JSON should look like this:
+        {{
+          "comment": "Here is a bar chart showing the total revenue by region.",
+          "chart_details": {{
+            "type": "bar",
+            "x_col": "region",
+            "y_col": "total_revenue",
+            "title": "Total Revenue by Region"
+          }},
+          "data": [ {{"region": "North", "total_revenue": 867.5}}, ... ]
+        }}
+
+        For a PIE CHART, the JSON should look like this:
+        {{
+          "comment": "Here is a pie chart showing the revenue distribution by product.",
+          "chart_details": {{
+            "type": "pie",
+            "names_col": "product",
+            "values_col": "total_revenue",
+            "title": "Revenue Distribution by Product"
+          }},
+          "data": [ {{"product": "Widget A", "total_revenue": 1130.0}}, ... ]
+        }}
+
+        If the user asks a regular question, just answer in natural language.
+        """),
+        ("human", "{input}"),
+        ("placeholder", "{agent_scratchpad}"),
+    ])
+
+class WorkerCancelled(Exception):
+    """Raised inside a speculative worker once the other source has already answered."""
+
+def _cancel_callback(cancelled: threading.Event):
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class _StopWhenCancelled(BaseCallbackHandler):
+        raise_error = True
+        def _check(self, *args, **kwargs):
+            if cancelled.is_set(): raise WorkerCancelled()
+        on_llm_start = on_chat_model_start = on_tool_start = _check
+
+    return _StopWhenCancelled()
+
+def _run_sql_worker(question: str, cancelled: threading.Event | None = None) -> str:
+    from langchain.agents import AgentExecutor, create_tool_calling_agent
+    sql_tool = registry.get("tools")["sql"]
+    agent = create_tool_calling_agent(get_llm(), [sql_tool], registry.get("prompt"))
+    agent_executor = AgentExecutor(agent=agent, tools=[sql_tool], verbose=True)
+    config = {"callbacks": [_cancel_callback(cancelled)]} if cancelled is not None else None
+    response = agent_executor.invoke({"input": question}, config=config)
+    return response["output"]
+
+def _run_rag_worker(question: str, cancelled: threading.Event | None = None) -> str:
+    return _memoized("rag", question, lambda: registry.get("tools")["rag"].invoke(question))
+
+def _is_useful(context) -> bool:
+    """Whether a worker's context actually answers something, as opposed to an empty result or a stock failure message."""
+    text = str(context or "").strip()
+    return bool(text) and not text.startswith(("No document has been uploaded", "Agent stopped", "An error occurred"))
 
+@timed("sql_node")
 def sql_node(state: AgentState) -> dict:
     print("---SQL NODE---")
-    agent = create_tool_calling_agent(llm, [sql_tool], prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=[sql_tool], verbose=True)
-    response = agent_executor.invoke({"input": state["input"]})
-    return {"context": response["output"]}
+    return {"context": _run_sql_worker(state["input"]), "source": "sql"}
 
+@timed("rag_node")
 def rag_node(state: AgentState) -> dict:
     print("---RAG NODE---")
-    response = rag_tool.invoke(state["input"])
-    return {"context": response}
+    return {"context": _run_rag_worker(state["input"]), "source": "rag"}
+
+@timed("parallel_node")
+def parallel_node(state: AgentState) -> dict:
+    """
+    Runs the SQL and RAG workers concurrently. If the source the router leaned towards finishes
+    first with a useful answer, the other worker is cancelled; otherwise both contexts are merged.
+    """
+    print("---PARALLEL NODE---")
+    cancelled = threading.Event()
+    futures = {_worker_pool.submit(contextvars.copy_context().run, worker, state["input"], cancelled): source for source, worker in (("sql", _run_sql_worker), ("rag", _run_rag_worker))}
+    contexts, pending = {}, set(futures)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                contexts[futures[future]] = future.result()
+            except Exception as e:
+                print(f"Parallel {futures[future]} worker failed: {e}")
+        winner = next((source for source in contexts if source == state.get("preferred") and _is_useful(contexts[source])), None)
+        if winner and pending:
+            cancelled.set()
+            for future in pending: future.cancel()
+            PARALLEL_OUTCOMES.inc(outcome=f"{winner}_won")
+            return {"context": contexts[winner], "source": winner}
 
+    useful = {source: context for source, context in contexts.items() if _is_useful(context)}
+    if len(useful) == 1:
+        source, context = next(iter(useful.items()))
+        PARALLEL_OUTCOMES.inc(outcome=f"{source}_only")
+        return {"context": context, "source": source}
+    PARALLEL_OUTCOMES.inc(outcome="merged")
+    return {"context": context_service.merge_sources(contexts.get('sql', ''), contexts.get('rag', '')), "source": "both"}
+
+@timed("generate_node")
 def generate_node(state: AgentState) -> dict:
     print("---GENERATE---")
     question = state["input"]
-    context = state["context"]
+    context = context_service.assemble_context(question, state["context"], state.get("source"))
     prompt_text = f"""You are a helpful assistant. Based on the following context that was retrieved,
     provide a concise, natural language answer to the user's question. If the context is a JSON object for a chart,
     simply return the JSON object as-is.
@@ -112,28 +267,118 @@ def generate_node(state: AgentState) -> dict:
     User's Question:
     {question}
     """
-    response = llm.invoke(prompt_text)
+    response = get_llm().invoke(prompt_text)
     return {"result": response.content}
 
 # --- 5. Build the Graph ---
-workflow = StateGraph(AgentState)
-workflow.add_node("sql_node", sql_node)
-workflow.add_node("rag_node", rag_node)
-workflow.add_node("generate_node", generate_node)
-workflow.set_conditional_entry_point(router, {"sql_node": "sql_node", "rag_node": "rag_node"})
-workflow.add_edge("sql_node", "generate_node")
-workflow.add_edge("rag_node", "generate_node")
-workflow.add_edge("generate_node", END)
-agent_graph = workflow.compile()
-print("Upgraded multi-agent graph compiled successfully.")
+def _build_agent_graph():
+    from langgraph.graph import StateGraph, END
+    workflow = StateGraph(AgentState)
+    workflow.add_node("router_node", router_node)
+    workflow.add_node("sql_node", sql_node)
+    workflow.add_node("rag_node", rag_node)
+    workflow.add_node("parallel_node", parallel_node)
+    workflow.add_node("generate_node", generate_node)
+    workflow.set_entry_point("router_node")
+    workflow.add_conditional_edges("router_node", lambda state: state["route"], {"sql_node": "sql_node", "rag_node": "rag_node", "parallel_node": "parallel_node"})
+    workflow.add_edge("sql_node", "generate_node")
+    workflow.add_edge("rag_node", "generate_node")
+    workflow.add_edge("parallel_node", "generate_node")
+    workflow.add_edge("generate_node", END)
+    agent_graph = workflow.compile()
+    print("Upgraded multi-agent graph compiled successfully.")
+    return agent_graph
+
+registry.register("llm", lambda: _with_metrics(build_llm()), warm=True)
+registry.register("sql_database", _build_sql_database, warm=True)
+registry.register("sql_agent", _build_sql_agent, warm=True)
+registry.register("tools", _build_tools)
+registry.register("prompt", _build_prompt)
+registry.register("agent_graph", _build_agent_graph, warm=True)
 
 # --- 6. Main service functions ---
 def run_query(query: str):
     try:
-        response = agent_graph.invoke({"input": query})
+        response = registry.get("agent_graph").invoke({"input": query})
         return response.get('result', "No result found.")
     except Exception as e:
         return f"An error occurred in the agent graph: {e}"
 
+def route_batch(questions: list[str]) -> list[tuple[str, str]]:
+    """Routes many questions with a single LLM call, falling back to per-question routing for unparsed lines."""
+    numbered = "\n".join(f"    {i + 1}. {question}" for i, question in enumerate(questions))
+    router_prompt = f"""Decide which tool is the most appropriate for each of the numbered user questions below.
+    Your options are:
+    - 'SQLDatabase': For questions about sales, revenue, products, and regions in the database.
+    - 'FinancialReportSearch': For questions about financial reports, CEO statements, or uploaded summaries/documents.
+    - 'BOTH': For questions that need the database and the documents together, e.g. comparing the report with the sales data.
+
+    Questions:
+{numbered}
+
+    Respond with ONLY one line per question in the form "<number>. <option> <confidence between 0 and 1>", e.g. "1. SQLDatabase 0.9".
+    """
+    with timed("batch_router"):
+        answer = get_llm().invoke(router_prompt).content
+    answers = {int(m.group(1)) - 1: m.group(2) for m in re.finditer(r"^\s*(\d+)[.)]\s*(.+)$", answer, re.MULTILINE)}
+    routes = []
+    for i, question in enumerate(questions):
+        if i in answers: routes.append(_parse_route(answers[i]))
+        else:
+            state = router_node({"input": question})
+            routes.append((state["route"], state["preferred"]))
+    return routes
+
+def _run_batch_item(question: str, route: str, preferred: str) -> str:
+    def compute():
+        try:
+            response = registry.get("agent_graph").invoke({"input": question, "route": route, "preferred": preferred})
+            return response.get('result', "No result found.")
+        except Exception as e:
+            return f"An error occurred in the agent graph: {e}"
+    return _memoized("query", question, compute)
+
+async def stream_batch(questions: list[str], max_parallel: int | None = None, admission=None):
+    """
+    Answers many questions at once, yielding (index, answer) as each finishes. Routing happens in one
+    LLM call, retrieval embeds all document questions in one batch, and identical retrievals, SQL
+    results and questions are computed once. At most max_parallel graphs run concurrently, each
+    also holding a slot from the admission factory when one is given.
+    """
+    max_parallel = max(1, min(max_parallel or BATCH_MAX_PARALLEL, BATCH_MAX_PARALLEL))
+    _batch_memo.set({"lock": threading.Lock(), "entries": {}})
+    # The response status is already sent when this runs, so batch-level failures fall back to per-item work
+    # (routing inside each graph, retrieval through the memo) and surface as per-item error answers.
+    try:
+        routes = await asyncio.to_thread(route_batch, questions)
+    except Exception as e:
+        print(f"Batch routing failed, routing per question: {e}")
+        routes = [("", "")] * len(questions)
+
+    document_questions = [q for q, (route, _) in zip(questions, routes) if route != "sql_node"]
+    if document_questions:
+        try:
+            retrieved = await asyncio.to_thread(rag_service.query_rag_batch, document_questions)
+        except Exception as e:
+            print(f"Batch retrieval failed, retrieving per question: {e}")
+            retrieved = {}
+        memo = _batch_memo.get()
+        for question, context in retrieved.items():
+            memo["entries"][("rag", question)] = future = Future()
+            future.set_result(context)
+
+    semaphore = asyncio.Semaphore(max_parallel)
+    async def run_item(index: int):
+        async with semaphore, (admission() if admission else contextlib.nullcontext()):
+            return index, await asyncio.to_thread(_run_batch_item, questions[index], *routes[index])
+
+    tasks = [asyncio.ensure_future(run_item(i)) for i in range(len(questions))]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # A closed stream (e.g. the client disconnected) cancels every item still waiting to start.
+        for task in tasks: task.cancel()
+
 def create_agent():
-    return agent_graph
+    return registry.get("agent_graph")
@@ -0,0 +1,133 @@
+# app/services/context_service.py
+import os
+import re
+from app.core.metrics import Counter
+
+ENABLE_CONTEXT_COMPRESSION = os.getenv("ENABLE_CONTEXT_COMPRESSION", "true").lower() == "true"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500))
+# Share of the budget kept for documents when SQL and document context are merged.
+CONTEXT_DOCUMENT_SHARE = float(os.getenv("CONTEXT_DOCUMENT_SHARE", 0.4))
+
+CONTEXT_TOKENS = Counter("insightgpt_context_tokens_total", "Estimated context tokens before (raw) and after (assembled) context assembly.", ["stage"])
+CONTEXT_TOKENS_SAVED = Counter("insightgpt_context_tokens_saved_total", "Estimated prompt tokens removed by context assembly.")
+
+CHUNK_SEPARATOR = "\n---\n"
+# rag_service splits with chunk_overlap=150; anything shorter than MIN_CHUNK_OVERLAP is treated as coincidence.
+MIN_CHUNK_OVERLAP, MAX_CHUNK_OVERLAP = 20, 400
+SQL_HEADER, DOCUMENTS_HEADER = "[Sales database]", "[Document search]"
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+STOPWORDS = frozenset("""a an the and or but if of to in on at by for with about from into over as is are was were be been
+being do does did what which who whom whose when where why how this that these those it its our your their my me we you
+they he she them us i can could should would will shall may might than then there here any all some such not no so per
+vs versus compare compared tell show give me please""".split())
+
+def estimate_tokens(text: str) -> int:
+    """A provider-neutral estimate (~4 characters per token) used for budgeting and metrics."""
+    return (len(text) + 3) // 4
+
+def _terms(text: str) -> set[str]:
+    return {word for word in _WORD.findall(text.lower()) if word not in STOPWORDS and len(word) > 2}
+
+def _normalise(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def _overlap(tail_of: str, head_of: str) -> int:
+    """Length of the longest end of tail_of that is also the start of head_of (the splitter's chunk overlap)."""
+    for size in range(min(len(tail_of), len(head_of), MAX_CHUNK_OVERLAP), MIN_CHUNK_OVERLAP - 1, -1):
+        if tail_of.endswith(head_of[:size]): return size
+    return 0
+
+def _strip_overlaps(chunks: list[str]) -> list[str]:
+    """
+    Removes text a chunk shares with an earlier-ranked one at their boundary. Retrieval order is not
+    document order, so a chunk's start is checked against earlier ends and its end against earlier starts.
+    """
+    kept = []
+    for chunk in chunks:
+        start, end = 0, len(chunk)
+        for earlier in kept:
+            start = max(start, _overlap(earlier, chunk))
+            end = min(end, len(chunk) - _overlap(chunk, earlier))
+        kept.append(chunk[start:end].strip() if start < end else "")
+    return kept
+
+def merge_sources(sql_context: str, document_context: str) -> str:
+    """The labelled context used when both the database and the documents contributed."""
+    return f"{SQL_HEADER}\n{sql_context}\n\n{DOCUMENTS_HEADER}\n{document_context}"
+
+def _cap_lines(text: str, budget_tokens: int) -> str:
+    """Keeps whole lines (table rows, list items) of SQL output until the budget is reached, noting how many were cut."""
+    if estimate_tokens(text) <= budget_tokens: return text
+    lines, kept, used = text.split("\n"), [], 10  # room for the omission note
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget_tokens: break
+        kept.append(line)
+        used += cost
+    if not kept: return lines[0][: budget_tokens * 4]
+    return "\n".join(kept) + f"\n... ({len(lines) - len(kept)} more lines omitted)"
+
+def _compress_documents(question: str, context: str, budget_tokens: int) -> str:
+    """
+    Drops the overlap between neighbouring chunks and exact repeated sentences. If the rest still
+    exceeds the budget, the sentences sharing the fewest terms with the question are cut first.
+    Chunks, lines and sentences keep their original order, so lists and tables survive.
+    """
+    question_terms = _terms(question)
+    candidates, seen = [], set()
+    for chunk_rank, chunk in enumerate(_strip_overlaps([chunk.strip() for chunk in context.split(CHUNK_SEPARATOR)])):
+        for line_no, line in enumerate(chunk.split("\n")):
+            for position, sentence in enumerate(s.strip() for s in _SENTENCE_SPLIT.split(line)):
+                normalised = _normalise(sentence)
+                if not normalised or normalised in seen: continue
+                seen.add(normalised)
+                candidates.append([len(question_terms & _terms(sentence)), (chunk_rank, line_no, position), sentence])
+
+    if sum(estimate_tokens(c[2]) + 1 for c in candidates) > budget_tokens:
+        # A sentence right after a hit often carries its figures ("It brought in $867.50"), so it inherits half the score.
+        for previous, candidate in zip(candidates, candidates[1:]):
+            if previous[1][:2] == candidate[1][:2] and previous[0] and not candidate[0]: candidate[0] = previous[0] / 2
+        selected, used = [], 0
+        for candidate in sorted(candidates, key=lambda c: (-c[0], c[1])):
+            cost = estimate_tokens(candidate[2]) + 1
+            if used + cost > budget_tokens:
+                if selected: continue
+                # Always keep something: the best sentence, truncated to the budget.
+                candidate = [candidate[0], candidate[1], candidate[2][: budget_tokens * 4]]
+            selected.append(candidate)
+            used += cost
+        candidates = selected
+
+    chunks = {}
+    for _, (chunk_rank, line_no, _), sentence in sorted(candidates, key=lambda c: c[1]):
+        chunks.setdefault(chunk_rank, {}).setdefault(line_no, []).append(sentence)
+    return CHUNK_SEPARATOR.join("\n".join(" ".join(line) for _, line in sorted(lines.items())) for _, lines in sorted(chunks.items()))
+
+def assemble_context(question: str, context: str, source: str | None = None, budget_tokens: int | None = None) -> str:
+    """
+    Shrinks retrieved context to the token budget before generation, given which source produced it
+    ("sql", "rag" or "both"). SQL agent output is never filtered by relevance, only capped by whole
+    lines; document chunks are deduplicated and trimmed. A merged context keeps CONTEXT_DOCUMENT_SHARE
+    of the budget for documents. Chart JSON passes through untouched so it still parses.
+    """
+    budget_tokens = CONTEXT_TOKEN_BUDGET if budget_tokens is None else budget_tokens
+    if not ENABLE_CONTEXT_COMPRESSION or not context or '"chart_details"' in context:
+        return context
+
+    raw_tokens = estimate_tokens(context)
+    if source == "sql":
+        assembled = _cap_lines(context, budget_tokens)
+    elif source == "both" and f"\n\n{DOCUMENTS_HEADER}\n" in context:
+        sql_part, documents = context.split(f"\n\n{DOCUMENTS_HEADER}\n", 1)
+        sql_part = _cap_lines(sql_part, budget_tokens - int(budget_tokens * CONTEXT_DOCUMENT_SHARE))
+        remaining = budget_tokens - estimate_tokens(sql_part)
+        assembled = f"{sql_part}\n\n{DOCUMENTS_HEADER}\n{_compress_documents(question, documents, remaining)}"
+    else:
+        assembled = _compress_documents(question, context, budget_tokens)
+
+    assembled_tokens = estimate_tokens(assembled)
+    CONTEXT_TOKENS.inc(raw_tokens, stage="raw")
+    CONTEXT_TOKENS.inc(assembled_tokens, stage="assembled")
+    CONTEXT_TOKENS_SAVED.inc(max(0, raw_tokens - assembled_tokens))
+    return assembled
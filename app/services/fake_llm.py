@@ -0,0 +1,96 @@
+# app/services/fake_llm.py
+import ast
+import asyncio
+import json
+import re
+import time
+import uuid
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+SCRIPTED_SQL = "SELECT region, SUM(total_revenue) AS total_revenue FROM sales_data GROUP BY region"
+DOCUMENT_KEYWORDS = ("report", "ceo", "document", "summary", "pdf", "quarter")
+DATA_KEYWORDS = ("sales", "revenue", "region", "product", "units", "sold")
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    A deterministic offline stand-in for the Gemini chat model. It follows the same call
+    pattern as the real pipeline (routing, tool calls for the SQL agents, final generation)
+    with a configurable per-call latency, so throughput can be measured without API quota.
+    """
+    latency: float = 0.05
+    bound_tools: list[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.model_copy(update={"bound_tools": names})
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return self._result(messages, self._tool_names(kwargs))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return self._result(messages, self._tool_names(kwargs))
+
+    def _tool_names(self, kwargs) -> list[str]:
+        # create_sql_agent's "openai-tools" agent attaches tools with llm.bind(tools=...), not bind_tools.
+        return self.bound_tools + [convert_to_openai_tool(tool)["function"]["name"] for tool in kwargs.get("tools") or ()]
+
+    def _result(self, messages, tool_names: list[str]) -> ChatResult:
+        message = self._respond(messages, tool_names)
+        prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+        completion_tokens = len(str(message.content)) // 4
+        message.usage_metadata = {"input_tokens": prompt_tokens, "output_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _respond(self, messages, tool_names: list[str]) -> AIMessage:
+        tool_result = next((m for m in reversed(messages) if isinstance(m, ToolMessage)), None)
+        question = next((str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)), str(messages[-1].content))
+        if "sql_db_query" in tool_names:
+            if tool_result is None: return _tool_call("sql_db_query", {"query": SCRIPTED_SQL})
+            return AIMessage(content=_summarise_rows(question, tool_result.content))
+        if "SQLDatabase" in tool_names:
+            if tool_result is None: return _tool_call("SQLDatabase", {"__arg1": question})
+            return AIMessage(content=str(tool_result.content))
+
+        text = str(messages[-1].content)
+        if "Respond with ONLY the name of the" in text:
+            return AIMessage(content=_route(text.split("User Question:", 1)[-1].split("Respond with", 1)[0]))
+        if "Respond with ONLY one line per question" in text:
+            numbered = text.split("Questions:", 1)[-1].split("Respond with", 1)[0]
+            lines = [f"{m.group(1)}. {_route(m.group(2))}" for m in re.finditer(r"^\s*(\d+)\.\s*(.+)$", numbered, re.MULTILINE)]
+            return AIMessage(content="\n".join(lines))
+        context = text.split("Context:", 1)[-1].split("User's Question:", 1)[0].strip()
+        if '"chart_details"' in context: return AIMessage(content=context)
+        return AIMessage(content=f"Based on the retrieved context: {context[:300]}")
+
+def _route(question: str) -> str:
+    asked = question.lower()
+    about_documents, about_data = any(w in asked for w in DOCUMENT_KEYWORDS), any(w in asked for w in DATA_KEYWORDS)
+    if about_documents and about_data: return "BOTH 0.5"
+    return "FinancialReportSearch 0.9" if about_documents else "SQLDatabase 0.9"
+
+def _tool_call(name: str, args: dict) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:12]}"}])
+
+def _summarise_rows(question: str, rows_text) -> str:
+    """Turns the scripted query's rows into a chart JSON or a sentence, like the real agent would."""
+    try:
+        rows = ast.literal_eval(str(rows_text))
+    except (ValueError, SyntaxError):
+        return f"The query returned: {rows_text}"
+    data = [{"region": region, "total_revenue": revenue} for region, revenue in rows]
+    if "chart" in question.lower() or "plot" in question.lower():
+        return json.dumps({
+            "comment": "Here is a bar chart showing the total revenue by region.",
+            "chart_details": {"type": "bar", "x_col": "region", "y_col": "total_revenue", "title": "Total Revenue by Region"},
+            "data": data,
+        })
+    return "Total revenue by region: " + ", ".join(f"{row['region']}: {row['total_revenue']:.2f}" for row in data)
@@ -0,0 +1,211 @@
+# app/services/index_store.py
+# A versioned on-disk FAISS index shared by every worker on the host. Writers publish a new
+# version directory and then atomically repoint CURRENT at it; workers memory-map the vectors
+# read-only, read chunk text from a per-version SQLite file, and poll CURRENT to hot-swap.
+import os
+import json
+import time
+import fcntl
+import shutil
+import sqlite3
+import threading
+from app.core.metrics import Counter, timed
+
+INDEX_ROOT = os.getenv("VECTOR_INDEX_DIR", os.path.join('data', 'vector_index'))
+POLL_SECONDS = float(os.getenv("VECTOR_INDEX_POLL_SECONDS", 2))
+KEEP_VERSIONS = int(os.getenv("VECTOR_INDEX_KEEP_VERSIONS", 3))
+
+# Index type: "auto" keeps an exact flat index below FLAT_THRESHOLD vectors and switches to
+# INDEX_COMPRESSION above it; "flat", "sq8" (int8 scalar quantizer), "ivfsq8" and "ivfpq" force one.
+INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "auto")
+# ivfsq8 is the default: in scripts/bench_vector_index.py it kept recall@4 near 0.97 at nprobe=32
+# with ~4x less memory, while 8-bit IVF-PQ lost far more recall and trains slowly.
+INDEX_COMPRESSION = os.getenv("VECTOR_INDEX_COMPRESSION", "ivfsq8")
+FLAT_THRESHOLD = int(os.getenv("VECTOR_INDEX_FLAT_THRESHOLD", 20000))
+PQ_SUBQUANTIZERS = int(os.getenv("VECTOR_INDEX_PQ_M", 48))
+NPROBE = int(os.getenv("VECTOR_INDEX_NPROBE", 32))
+
+INDEX_RELOADS = Counter("insightgpt_vector_index_reloads_total", "Times this worker swapped to a newly published index version.")
+
+_current = None
+_current_version = None
+_swap_lock = threading.Lock()
+_watcher = None
+
+def _versions_dir() -> str:
+    return os.path.join(INDEX_ROOT, "versions")
+
+def _pointer_path() -> str:
+    return os.path.join(INDEX_ROOT, "CURRENT")
+
+def read_current_version() -> str | None:
+    try:
+        with open(_pointer_path()) as f: return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+class SqliteDocstore:
+    """
+    Read-only chunk store backed by one SQLite file, so chunk text lives in the shared page cache rather
+    than each worker's heap. The connection is opened up front and shared by all threads, so the store
+    keeps working after _prune removes its version directory.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # immutable=1: published versions never change, so SQLite skips locking and journal files.
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro&immutable=1", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def search(self, search: str):
+        from langchain_core.documents import Document
+        with self._lock:
+            row = self._connection.execute("SELECT page_content, metadata FROM chunks WHERE id = ?", (search,)).fetchone()
+        if row is None: return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+def index_spec(n_vectors: int, dimension: int, mode: str | None = None) -> str:
+    """Picks a faiss.index_factory string for a corpus of the given size."""
+    mode = mode or INDEX_MODE
+    if mode == "auto": mode = "flat" if n_vectors < FLAT_THRESHOLD else INDEX_COMPRESSION
+    nlist = max(1, min(int(4 * n_vectors ** 0.5), n_vectors // 39))
+    # IVF needs ~39 training points per list and 8-bit PQ codebooks need 39 * 256; below that step down.
+    if mode == "ivfpq" and n_vectors < 39 * 256: mode = "ivfsq8"
+    if mode == "ivfsq8" and n_vectors < 39 * 16: mode = "sq8"
+    if mode == "ivfpq":
+        m = PQ_SUBQUANTIZERS if dimension % PQ_SUBQUANTIZERS == 0 else next(d for d in (64, 48, 32, 24, 16, 8, 4, 2, 1) if dimension % d == 0)
+        return f"IVF{nlist},PQ{m}x8"
+    if mode == "ivfsq8": return f"IVF{nlist},SQ8"
+    if mode == "sq8": return "SQ8"
+    return "Flat"
+
+def set_nprobe(index, nprobe: int = NPROBE):
+    """Sets how many IVF lists a search visits (recall vs latency); a no-op for non-IVF indexes."""
+    import faiss
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+
+def build_faiss_index(vectors, mode: str | None = None):
+    """Builds, trains if needed, and fills a FAISS index for float32 vectors of shape (n, d)."""
+    import faiss
+    import numpy as np
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    spec = index_spec(len(vectors), vectors.shape[1], mode)
+    index = faiss.index_factory(vectors.shape[1], spec)
+    if not index.is_trained: index.train(vectors)
+    index.add(vectors)
+    set_nprobe(index)
+    print(f"Built '{spec}' index over {len(vectors)} vectors.")
+    return index
+
+def build_vector_store(docs, embeddings, mode: str | None = None):
+    """Embeds chunks in one batch and wraps an index chosen by index_spec in a LangChain FAISS store."""
+    import uuid
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    with timed("index_build"):
+        vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+        index = build_faiss_index(vectors, mode)
+    ids = [str(uuid.uuid4()) for _ in docs]
+    return FAISS(embedding_function=embeddings, index=index, docstore=InMemoryDocstore(dict(zip(ids, docs))), index_to_docstore_id=dict(enumerate(ids)))
+
+def publish(vectorstore) -> str:
+    """
+    Writes a LangChain FAISS vector store as a new version and makes it current. The version
+    directory is fully written before CURRENT is replaced, so readers never see a partial index.
+    """
+    import faiss
+    os.makedirs(_versions_dir(), exist_ok=True)
+    version = f"v{time.time_ns()}"
+    staging = os.path.join(_versions_dir(), f".{version}.tmp")
+    os.makedirs(staging)
+    faiss.write_index(vectorstore.index, os.path.join(staging, "index.faiss"))
+    with sqlite3.connect(os.path.join(staging, "docstore.sqlite")) as connection:
+        connection.execute("CREATE TABLE chunks (id TEXT PRIMARY KEY, page_content TEXT, metadata TEXT)")
+        connection.executemany("INSERT INTO chunks VALUES (?, ?, ?)", (
+            (doc_id, doc.page_content, json.dumps(doc.metadata, default=str))
+            for doc_id, doc in ((i, vectorstore.docstore.search(i)) for i in vectorstore.index_to_docstore_id.values())
+        ))
+    with open(os.path.join(staging, "ids.json"), "w") as f:
+        json.dump([vectorstore.index_to_docstore_id[i] for i in range(len(vectorstore.index_to_docstore_id))], f)
+    with open(os.path.join(staging, "index.json"), "w") as f:
+        json.dump({"ivf": faiss.try_extract_index_ivf(vectorstore.index) is not None, "ntotal": vectorstore.index.ntotal}, f)
+    os.replace(staging, os.path.join(_versions_dir(), version))
+
+    # Serialise pointer updates across writer processes.
+    with open(os.path.join(INDEX_ROOT, ".publish.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        pointer_tmp = f"{_pointer_path()}.{os.getpid()}.tmp"
+        with open(pointer_tmp, "w") as f:
+            f.write(version); f.flush(); os.fsync(f.fileno())
+        os.replace(pointer_tmp, _pointer_path())
+        _prune(keep=version)
+    print(f"--- ✅ Published vector index version {version} ---")
+    return version
+
+def _prune(keep: str):
+    """
+    Removes all but the newest versions. A worker still on a removed version is unaffected: its index
+    mapping and docstore connection were opened when it loaded, and open files outlive their unlink.
+    """
+    versions = sorted(v for v in os.listdir(_versions_dir()) if v.startswith("v"))
+    for version in versions[:-KEEP_VERSIONS]:
+        if version != keep: shutil.rmtree(os.path.join(_versions_dir(), version), ignore_errors=True)
+
+def _open_version(version: str, embeddings):
+    import faiss
+    from langchain_community.vectorstores import FAISS
+    path = os.path.join(_versions_dir(), version)
+    index_file = os.path.join(path, "index.faiss")
+    try:
+        with open(os.path.join(path, "index.json")) as f: is_ivf = json.load(f)["ivf"]
+    except FileNotFoundError:
+        is_ivf = True  # Versions published before index.json was written keep the previous IO_FLAG_MMAP behaviour.
+    # IO_FLAG_MMAP only maps IVF inverted lists and silently copies flat/SQ codes into the heap;
+    # IO_FLAG_MMAP_IFC maps those codes in place. Either way the pages stay in the shared page cache.
+    mmap_flag = faiss.IO_FLAG_MMAP if is_ivf else getattr(faiss, "IO_FLAG_MMAP_IFC", None)
+    if mmap_flag is None:
+        print("⚠️ This FAISS build cannot memory-map flat indexes; loading a private copy.")
+        index = faiss.read_index(index_file)
+    else:
+        index = faiss.read_index(index_file, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+    set_nprobe(index)
+    with open(os.path.join(path, "ids.json")) as f:
+        index_to_docstore_id = dict(enumerate(json.load(f)))
+    return FAISS(embedding_function=embeddings, index=index, docstore=SqliteDocstore(os.path.join(path, "docstore.sqlite")), index_to_docstore_id=index_to_docstore_id)
+
+def current():
+    """The vector store for the current version, or None before anything is published."""
+    return _current
+
+def reload(embeddings) -> bool:
+    """Swaps to the published version if it changed. In-flight queries keep using the store they already hold."""
+    global _current, _current_version
+    version = read_current_version()
+    if version is None or version == _current_version: return False
+    with _swap_lock:
+        if version == _current_version: return False
+        with timed("vector_index_load"):
+            store = _open_version(version, embeddings)
+        _current, _current_version = store, version
+    INDEX_RELOADS.inc()
+    print(f"--- ✅ Loaded vector index version {version} ---")
+    return True
+
+def start_watcher(embeddings_factory):
+    """Starts a daemon thread that polls CURRENT and hot-swaps to new versions."""
+    global _watcher
+    if _watcher is not None: return
+
+    def watch():
+        while True:
+            time.sleep(POLL_SECONDS)
+            try:
+                if read_current_version() != _current_version: reload(embeddings_factory())
+            except Exception as e:
+                print(f"⚠️ Vector index reload failed: {e}")
+
+    _watcher = threading.Thread(target=watch, name="vector-index-watcher", daemon=True)
+    _watcher.start()
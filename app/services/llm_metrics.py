@@ -0,0 +1,31 @@
+# app/services/llm_metrics.py
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from app.core.metrics import STAGE_LATENCY, STAGE_ERRORS, LLM_TOKENS
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records latency and prompt/completion token counts for every LLM call, including those inside agents."""
+
+    def __init__(self):
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._started.pop(run_id, None)
+        if start is not None: STAGE_LATENCY.observe(time.perf_counter() - start, stage="llm")
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                LLM_TOKENS.inc(usage.get("input_tokens", 0), kind="prompt")
+                LLM_TOKENS.inc(usage.get("output_tokens", 0), kind="completion")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._started.pop(run_id, None)
+        STAGE_ERRORS.inc(stage="llm")
+
+llm_metrics_callback = LLMMetricsCallback()
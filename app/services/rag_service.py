@@ -1,30 +1,77 @@
 # app/services/rag_service.py
 import os
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from app.core.metrics import timed
+from app.core.registry import registry
+from app.services import index_store
 
-_retriever = None
+# "huggingface" loads MiniLM locally; "fake" uses deterministic hash embeddings for offline benchmarks.
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "huggingface")
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 4))
 
+def _build_embeddings():
+    if EMBEDDING_PROVIDER == "fake":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        return DeterministicFakeEmbedding(size=384)
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    embeddings.embed_query("warmup")
+    return embeddings
+
+def get_embeddings():
+    """Returns the shared embedding model, loading it on first use."""
+    return registry.get("embeddings")
+
+def _load_vector_index():
+    """Opens the published shared index, if any, and starts watching for newer versions."""
+    index_store.reload(get_embeddings())
+    index_store.start_watcher(get_embeddings)
+    return index_store.current()
+
+registry.register("embeddings", _build_embeddings, warm=True)
+registry.register("vector_index", _load_vector_index, warm=True, required=False)
+
+def _active_store():
+    registry.get("vector_index")
+    return index_store.current()
+
+@timed("pdf_ingest")
 def process_and_load_pdf(pdf_file_path: str):
-    global _retriever
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
     print(f"--- Starting processing for: {pdf_file_path} ---")
     loader = PyPDFLoader(pdf_file_path)
     documents = loader.load()
     text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
     docs = text_splitter.split_documents(documents)
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    db = FAISS.from_documents(docs, embeddings)
-    _retriever = db.as_retriever()
+    db = index_store.build_vector_store(docs, get_embeddings())
+    # Publish for every worker on the host, then swap this worker over straight away.
+    index_store.publish(db)
+    index_store.reload(get_embeddings())
     print("--- ✅ PDF processed and retriever is ready ---")
 
 def query_rag(question: str) -> str:
     """Queries the currently active FAISS retriever and returns ONLY the context."""
-    global _retriever
-    if _retriever is None:
+    store = _active_store()
+    if store is None:
         return "No document has been uploaded and processed yet. Please upload a PDF first."
 
-    docs = _retriever.invoke(question)
+    with timed("faiss_retrieval"):
+        docs = store.as_retriever(search_kwargs={"k": RETRIEVAL_K}).invoke(question)
     # Return only the joined page content
-    return "\n---\n".join([doc.page_content for doc in docs])
\ No newline at end of file
+    return "\n---\n".join([doc.page_content for doc in docs])
+
+def query_rag_batch(questions: list[str]) -> dict[str, str]:
+    """Retrieves context for many questions, embedding all distinct questions in one batched call."""
+    store = _active_store()
+    if store is None:
+        return {question: "No document has been uploaded and processed yet. Please upload a PDF first." for question in questions}
+
+    unique_questions = list(dict.fromkeys(questions))
+    with timed("batch_embedding"):
+        vectors = get_embeddings().embed_documents(unique_questions)
+    contexts = {}
+    with timed("faiss_retrieval"):
+        for question, vector in zip(unique_questions, vectors):
+            docs = store.similarity_search_by_vector(vector, k=RETRIEVAL_K)
+            contexts[question] = "\n---\n".join([doc.page_content for doc in docs])
+    return contexts
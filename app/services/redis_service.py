@@ -4,22 +4,33 @@ import os
 import json
 import time
 from dotenv import load_dotenv
+from app.core.registry import registry
 
 load_dotenv()
 
-try:
-    redis_client = redis.Redis(
-        host=os.getenv("REDIS_HOST"), port=int(os.getenv("REDIS_PORT")),
-        password=os.getenv("REDIS_PASSWORD"), decode_responses=True,
-    )
-    redis_client.ping()
-    print("✅ Successfully connected to Redis.")
-except redis.exceptions.ConnectionError as e:
-    print(f"⚠️ Could not connect to Redis: {e}.")
-    redis_client = None
+def _connect():
+    """Connects to Redis, returning None when it is unreachable so session features degrade gracefully."""
+    try:
+        client = redis.Redis(
+            host=os.getenv("REDIS_HOST"), port=int(os.getenv("REDIS_PORT", 6379)),
+            password=os.getenv("REDIS_PASSWORD"), decode_responses=True,
+            socket_connect_timeout=float(os.getenv("REDIS_CONNECT_TIMEOUT", 5)),
+        )
+        client.ping()
+        print("✅ Successfully connected to Redis.")
+        return client
+    except (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError) as e:
+        print(f"⚠️ Could not connect to Redis: {e}.")
+        return None
+
+registry.register("redis", _connect, warm=True, required=False)
+
+def get_client():
+    return registry.get("redis")
 
 def create_new_session(username: str, chat_history: list) -> str:
     """Creates a new chat session in Redis and returns the session ID."""
+    redis_client = get_client()
     if not redis_client: return None
 
     session_id = f"{username}:{int(time.time())}"
@@ -39,6 +50,7 @@ def create_new_session(username: str, chat_history: list) -> str:
 
 def update_session(session_id: str, chat_history: list):
     """Updates an existing chat session in Redis."""
+    redis_client = get_client()
     if not redis_client: return
 
     session_key = f"session:{session_id}"
@@ -50,6 +62,7 @@ def update_session(session_id: str, chat_history: list):
 
 def get_sessions_for_user(username: str) -> list:
     """Retrieves a list of all session IDs and their titles for a user."""
+    redis_client = get_client()
     if not redis_client: return []
 
     user_sessions_key = f"user_sessions:{username}"
@@ -66,6 +79,7 @@ def get_sessions_for_user(username: str) -> list:
 
 def get_session(session_id: str) -> list:
     """Retrieves the chat history for a specific session ID."""
+    redis_client = get_client()
     if not redis_client: return []
 
     session_key = f"session:{session_id}"
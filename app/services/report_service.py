@@ -1,15 +1,17 @@
 # app/services/report_service.py
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
 from io import BytesIO
-import plotly.io as pio
 import json
+from app.core.metrics import timed
 
+@timed("report_render")
 def generate_report_from_history(chat_history: list) -> bytes:
     """
     Generates a PDF report from the conversation history.
     """
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import inch
+    import plotly.io as pio
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, rightMargin=inch/2, leftMargin=inch/2, topMargin=inch/2, bottomMargin=inch/2)
 
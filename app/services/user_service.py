@@ -1,8 +1,30 @@
 # app/services/user_service.py
 from app.core.security import get_password_hash
+from app.core.cache import TTLCache
 from app.schemas.user import UserCreate, UserInDB
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+import os, time
+
+# Decoded bearer token -> UserInDB, so authenticated requests skip the JWT decode and the user lookup.
+_token_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", 4096)),
+    ttl=float(os.getenv("AUTH_CACHE_TTL_SECONDS", 300)),
+    name="auth_token",
+)
+
+def get_cached_user(token: str) -> UserInDB | None:
+    """Returns the user previously resolved for this token, if still cached."""
+    return _token_cache.get(token)
+
+def cache_user(token: str, user: UserInDB, expires_at: float | None = None):
+    """Caches a resolved user, never past the token's own expiry."""
+    ttl = None if expires_at is None else expires_at - time.time()
+    _token_cache.set(token, user, ttl=ttl)
+
+def invalidate_user(username: str):
+    """Drops every cached token that resolves to the given user."""
+    _token_cache.discard_where(lambda cached: cached.username == username)
 
 def get_user(db: Session, username: str) -> UserInDB | None:
     """Fetches a single user from the database by username."""
@@ -14,9 +36,9 @@ def get_user(db: Session, username: str) -> UserInDB | None:
         return UserInDB(**user_data)
     return None
 
-def create_user(db: Session, user: UserCreate) -> UserInDB:
-    """Creates a new user in the database."""
-    hashed_password = get_password_hash(user.password)
+def create_user(db: Session, user: UserCreate, hashed_password: str | None = None) -> UserInDB:
+    """Creates a new user in the database, hashing the password unless a hash is supplied."""
+    if hashed_password is None: hashed_password = get_password_hash(user.password)
 
     insert_query = text("""
         INSERT INTO users (username, hashed_password)
@@ -24,6 +46,7 @@ def create_user(db: Session, user: UserCreate) -> UserInDB:
     """)
     db.execute(insert_query, {"username": user.username, "hashed_password": hashed_password})
     db.commit()
+    invalidate_user(user.username)
 
     new_user = get_user(db, user.username)
     if not new_user:
@@ -1,13 +1,15 @@
 # app/services/viz_service.py
-import plotly.express as px
-import pandas as pd
 import json
+from app.core.metrics import timed
 
+@timed("chart_build")
 def create_bar_chart(data: list[dict], x_col: str, y_col: str, title: str) -> str:
     """
     Takes data as a list of dicts, creates a bar chart with Plotly, and returns it as JSON.
     """
     print(f"Generating bar chart for: {title}")
+    import plotly.express as px
+    import pandas as pd
     try:
         df = pd.DataFrame(data)
         if x_col not in df.columns or y_col not in df.columns:
@@ -17,11 +19,14 @@ def create_bar_chart(data: list[dict], x_col: str, y_col: str, title: str) -> st
     except Exception as e:
         return json.dumps({"error": f"Could not generate chart: {e}"})
 
+@timed("chart_build")
 def create_pie_chart(data: list[dict], names_col: str, values_col: str, title: str) -> str:
     """
     Takes data as a list of dicts, creates a pie chart with Plotly, and returns it as JSON.
     """
     print(f"Generating pie chart for: {title}")
+    import plotly.express as px
+    import pandas as pd
     try:
         df = pd.DataFrame(data)
         if names_col not in df.columns or values_col not in df.columns:
@@ -1,5 +1,7 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+import hashlib
 import json
 import plotly.io as pio
 import os
@@ -11,6 +13,8 @@ API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8000")
 TOKEN_URL, GUEST_TOKEN_URL, REGISTER_URL = f"{API_BASE_URL}/token", f"{API_BASE_URL}/guest-token", f"{API_BASE_URL}/register"
 QUERY_URL, UPLOAD_URL, REPORT_URL = f"{API_BASE_URL}/query", f"{API_BASE_URL}/upload", f"{API_BASE_URL}/report"
 SESSIONS_URL = f"{API_BASE_URL}/sessions"
+SESSIONS_CACHE_TTL = int(os.getenv("SESSIONS_CACHE_TTL_SECONDS", 60))
+HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL_SECONDS", 300))
 
 # --- Custom CSS for Styling ---
 st.markdown("""
@@ -23,38 +27,77 @@ st.markdown("""
 # --- Session State Initialization ---
 for key, value in {
     'logged_in': False, 'token': "", 'chat_history': [], 'document_name': None,
-    'is_guest': False, 'current_session_id': None, 'past_sessions': []
+    'is_guest': False, 'current_session_id': None, 'past_sessions': [],
+    'cache_version': 0, 'report_pdf': None, 'report_for': None
 }.items():
     if key not in st.session_state:
         st.session_state[key] = value
 
+# --- API Client ---
+def get_http():
+    """One pooled requests.Session per browser session, so reruns reuse keep-alive connections to the API."""
+    if 'http' not in st.session_state:
+        http = requests.Session()
+        http.mount(API_BASE_URL, HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        st.session_state.http = http
+    return st.session_state.http
+
+def auth_headers():
+    return {"Authorization": f"Bearer {st.session_state.token}"}
+
+def invalidate_session_cache():
+    """Called after any write to /sessions; bumping the version makes the cached reads below miss for this user."""
+    st.session_state.cache_version += 1
+
+# Cached reads are keyed by token (one entry per user) and cache_version (explicit invalidation);
+# the leading underscore keeps the requests.Session out of Streamlit's cache key.
+@st.cache_data(ttl=SESSIONS_CACHE_TTL, show_spinner=False)
+def fetch_sessions(_http, token, cache_version):
+    response = _http.get(SESSIONS_URL, headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_data(ttl=HISTORY_CACHE_TTL, show_spinner=False)
+def fetch_session_history(_http, token, session_id, cache_version):
+    response = _http.get(f"{SESSIONS_URL}/{session_id}", headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    return response.json()
+
+@st.cache_resource(max_entries=128, show_spinner=False)
+def _figure_for_hash(chart_hash, _chart_json):
+    return pio.from_json(_chart_json)
+
+def chart_figure(chart_json):
+    """Parses a chart once and reuses the figure on every rerun that displays it."""
+    return _figure_for_hash(hashlib.sha1(chart_json.encode()).hexdigest(), chart_json)
+
 def handle_query_submission(query):
     """A centralized function to handle the query submission and API call."""
     st.session_state.chat_history.append({"role": "user", "content": query})
     with st.chat_message("user"): st.markdown(query)
     with st.chat_message("assistant"):
         with st.spinner("Thinking..."):
-            headers = {"Authorization": f"Bearer {st.session_state.token}"}
+            http, headers = get_http(), auth_headers()
             payload = {"query": query}
             try:
-                response = requests.post(QUERY_URL, headers=headers, json=payload)
+                response = http.post(QUERY_URL, headers=headers, json=payload)
                 if response.status_code == 200:
                     api_response = response.json()
                     answer, chart_json = api_response.get("answer"), api_response.get("chart_json")
                     st.markdown(answer)
                     assistant_message = {"role": "assistant", "content": answer}
                     if chart_json:
-                        fig = pio.from_json(chart_json)
-                        st.plotly_chart(fig, use_container_width=True)
+                        st.plotly_chart(chart_figure(chart_json), use_container_width=True)
                         assistant_message["chart"] = chart_json
                     st.session_state.chat_history.append(assistant_message)
                     if not st.session_state.is_guest:
                         if st.session_state.current_session_id:
-                            requests.put(f"{SESSIONS_URL}/{st.session_state.current_session_id}", headers=headers, json={"chat_history": st.session_state.chat_history})
+                            http.put(f"{SESSIONS_URL}/{st.session_state.current_session_id}", headers=headers, json={"chat_history": st.session_state.chat_history})
                         else:
-                            creation_response = requests.post(SESSIONS_URL, headers=headers, json={"chat_history": st.session_state.chat_history})
+                            creation_response = http.post(SESSIONS_URL, headers=headers, json={"chat_history": st.session_state.chat_history})
                             if creation_response.status_code == 200:
                                 st.session_state.current_session_id = creation_response.json().get("session_id")
+                        invalidate_session_cache()
                 else:
                     error_text = f"Error: {response.status_code} - {response.text}"
                     st.error(error_text)
@@ -68,10 +111,9 @@ def process_document_callback():
     uploaded_file = st.session_state.get("pdf_uploader")
     if uploaded_file is None: return
     with st.spinner(f"Processing '{uploaded_file.name}'..."):
-        headers = {"Authorization": f"Bearer {st.session_state.token}"}
         files = {'file': (uploaded_file.name, uploaded_file, 'application/pdf')}
         try:
-            response = requests.post(UPLOAD_URL, headers=headers, files=files)
+            response = get_http().post(UPLOAD_URL, headers=auth_headers(), files=files)
             if response.status_code == 200:
                 st.session_state.document_name = uploaded_file.name
                 st.toast(f"✅ Successfully processed '{uploaded_file.name}'!")
@@ -95,7 +137,7 @@ def show_login_page():
             if submitted:
                 form_data = {'username': username, 'password': password}
                 try:
-                    response = requests.post(TOKEN_URL, data=form_data)
+                    response = get_http().post(TOKEN_URL, data=form_data)
                     if response.status_code == 200:
                         token_data = response.json(); st.session_state.token = token_data.get("access_token"); st.session_state.logged_in = True
                         st.session_state.chat_history = []; st.session_state.document_name = None; st.session_state.is_guest = False; st.session_state.current_session_id = None; st.rerun()
@@ -104,7 +146,7 @@ def show_login_page():
         st.divider()
         if st.button("Continue as Guest"):
             try:
-                response = requests.post(GUEST_TOKEN_URL)
+                response = get_http().post(GUEST_TOKEN_URL)
                 if response.status_code == 200:
                     token_data = response.json(); st.session_state.token = token_data.get("access_token"); st.session_state.logged_in = True
                     st.session_state.chat_history = []; st.session_state.document_name = None; st.session_state.is_guest = True; st.session_state.current_session_id = None; st.rerun()
@@ -119,26 +161,24 @@ def show_login_page():
             if signup_submitted:
                 payload = {"username": new_username, "password": new_password}
                 try:
-                    response = requests.post(REGISTER_URL, json=payload)
+                    response = get_http().post(REGISTER_URL, json=payload)
                     if response.status_code == 201: st.success("Account created! Please log in.")
                     elif response.status_code == 400: st.error("Username already exists.")
                     else: st.error(f"An error occurred: {response.text}")
                 except requests.exceptions.RequestException: st.error("Could not connect to the backend.")
 
 def show_main_app():
-    headers = {"Authorization": f"Bearer {st.session_state.token}"}
-    
+    http = get_http()
+
     def start_new_chat():
         st.session_state.chat_history = []
         st.session_state.current_session_id = None
     
     def load_session(session_id):
         try:
-            response = requests.get(f"{SESSIONS_URL}/{session_id}", headers=headers)
-            if response.status_code == 200:
-                st.session_state.chat_history = response.json()
-                st.session_state.current_session_id = session_id
-            else: st.error("Failed to load session.")
+            st.session_state.chat_history = list(fetch_session_history(http, st.session_state.token, session_id, st.session_state.cache_version))
+            st.session_state.current_session_id = session_id
+        except requests.exceptions.HTTPError: st.error("Failed to load session.")
         except requests.exceptions.RequestException: st.error("Connection error.")
 
     with st.sidebar:
@@ -150,6 +190,7 @@ def show_main_app():
         if st.button("Logout", use_container_width=True):
             st.session_state.logged_in = False
             st.session_state.token = ""
+            st.session_state.report_pdf = st.session_state.report_for = None
             st.rerun()
         
         st.divider()
@@ -159,14 +200,12 @@ def show_main_app():
         with st.expander("📜 Past Conversations"):
             if not st.session_state.is_guest:
                 try:
-                    response = requests.get(SESSIONS_URL, headers=headers)
-                    if response.status_code == 200:
-                        st.session_state.past_sessions = response.json()
-                        for session in st.session_state.past_sessions:
-                            if st.button(session['title'], key=session['id'], use_container_width=True):
-                                load_session(session['id'])
-                    else:
-                        st.caption("Could not load history.")
+                    st.session_state.past_sessions = fetch_sessions(http, st.session_state.token, st.session_state.cache_version)
+                    for session in st.session_state.past_sessions:
+                        if st.button(session['title'], key=session['id'], use_container_width=True):
+                            load_session(session['id'])
+                except requests.exceptions.HTTPError:
+                    st.caption("Could not load history.")
                 except requests.exceptions.RequestException:
                     st.error("Connection error.")
             else:
@@ -181,12 +220,21 @@ def show_main_app():
             if st.session_state.is_guest:
                 st.caption("Log in to generate reports.")
             elif st.session_state.chat_history:
-                try:
-                    report_response = requests.post(REPORT_URL, headers=headers, json={"chat_history": st.session_state.chat_history})
-                    if report_response.status_code == 200:
-                        st.download_button(label="Download Report", data=report_response.content, file_name="InsightGPT_Report.pdf", mime="application/pdf", use_container_width=True)
-                except requests.exceptions.RequestException:
-                    st.error("Report connection failed.")
+                # Reports are rendered on request and kept until the conversation changes, not on every rerun.
+                report_key = hashlib.sha1(json.dumps(st.session_state.chat_history, sort_keys=True).encode()).hexdigest()
+                if st.session_state.report_for != report_key:
+                    if st.button("Generate Report", use_container_width=True):
+                        try:
+                            with st.spinner("Generating report..."):
+                                report_response = http.post(REPORT_URL, headers=auth_headers(), json={"chat_history": st.session_state.chat_history})
+                            if report_response.status_code == 200:
+                                st.session_state.report_pdf, st.session_state.report_for = report_response.content, report_key
+                            else:
+                                st.error("Failed to generate report.")
+                        except requests.exceptions.RequestException:
+                            st.error("Report connection failed.")
+                if st.session_state.report_for == report_key:
+                    st.download_button(label="Download Report", data=st.session_state.report_pdf, file_name="InsightGPT_Report.pdf", mime="application/pdf", use_container_width=True)
             else:
                 st.caption("Start a conversation to generate a report.")
 
@@ -216,8 +264,7 @@ def show_main_app():
                 st.markdown(message["content"])
                 if "chart" in message:
                     try:
-                        fig = pio.from_json(message["chart"])
-                        st.plotly_chart(fig, use_container_width=True)
+                        st.plotly_chart(chart_figure(message["chart"]), use_container_width=True)
                     except (ValueError, json.JSONDecodeError):
                         st.error("Failed to display chart.")
 
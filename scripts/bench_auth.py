@@ -0,0 +1,63 @@
+# scripts/bench_auth.py
+# Measures per-request authentication overhead: the uncached path (JWT decode + user
+# lookup on a fresh connection) against the token cache used by get_current_user.
+import os
+import sys
+import time
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+
+from jose import jwt
+from sqlalchemy import create_engine, text
+from app.core.security import create_access_token, SECRET_KEY, ALGORITHM
+from app.schemas.user import UserCreate
+from app.services import user_service
+
+ITERATIONS = int(os.getenv("BENCH_ITERATIONS", 2000))
+
+def setup_engine():
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_auth.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username VARCHAR(255) UNIQUE NOT NULL, hashed_password VARCHAR(255) NOT NULL)"))
+        connection.commit()
+        user = user_service.create_user(connection, UserCreate(username="bench_user", password="bench-password"))
+    return engine, user
+
+def uncached_lookup(engine, token):
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    with engine.connect() as db:
+        return user_service.get_user(db=db, username=payload["sub"])
+
+def cached_lookup(engine, token):
+    user = user_service.get_cached_user(token)
+    if user is not None: return user
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    with engine.connect() as db:
+        user = user_service.get_user(db=db, username=payload["sub"])
+    user_service.cache_user(token, user, expires_at=payload.get("exp"))
+    return user
+
+def measure(label, fn, engine, token):
+    timings = []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        fn(engine, token)
+        timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{label:<10} mean={statistics.mean(timings):8.1f}us  p50={timings[len(timings) // 2]:8.1f}us  p99={p99:8.1f}us")
+
+def main():
+    engine, user = setup_engine()
+    token = create_access_token(data={"sub": user.username, "uid": user.id})
+    print(f"--- Auth overhead over {ITERATIONS} requests ---")
+    measure("uncached", uncached_lookup, engine, token)
+    measure("cached", cached_lookup, engine, token)
+
+if __name__ == "__main__":
+    main()
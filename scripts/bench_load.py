@@ -0,0 +1,188 @@
+# scripts/bench_load.py
+# Offline load test: drives /query, /upload, /report and the session endpoints concurrently
+# against the scripted fake LLM, fake embeddings, fakeredis and generated data, then reports
+# throughput and p50/p95/p99 per endpoint. Pass --base-url to target a running server instead.
+#
+#   python scripts/bench_load.py --users 20 --duration 30 --output bench_results.json
+#   python scripts/bench_load.py --compare bench_results.json
+import os
+import sys
+import io
+import json
+import time
+import random
+import argparse
+import asyncio
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+
+SCENARIO_WEIGHTS = {"query": 50, "list_sessions": 15, "save_session": 15, "get_session": 10, "report": 5, "upload": 5}
+CHART_QUESTION = "Show me a bar chart of revenue by region."
+QUESTIONS = [
+    "What were the total sales by region?",
+    CHART_QUESTION,
+    "Which region had the highest revenue?",
+    "What did the CEO say in the quarterly report?",
+    "Summarise the risks mentioned in the document.",
+]
+
+def generate_sales_db(path: str, rows: int):
+    """Creates a SQLite database with a users table and randomly generated sales_data rows."""
+    from sqlalchemy import create_engine, text
+    rng = random.Random(42)
+    regions, products = ["North", "South", "East", "West"], ["Widget A", "Widget B", "Gadget C", "Gizmo D"]
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        connection.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY AUTOINCREMENT, username VARCHAR(255) UNIQUE NOT NULL, hashed_password VARCHAR(255) NOT NULL)"))
+        connection.execute(text("CREATE TABLE sales_data (orderid INTEGER, orderdate TEXT, region TEXT, product TEXT, units INTEGER, saleprice REAL, total_revenue REAL)"))
+        records = []
+        for order_id in range(rows):
+            units, price = rng.randint(1, 100), round(rng.uniform(5, 50), 2)
+            records.append({"orderid": order_id, "orderdate": str(date(2025, 1, 1) + timedelta(days=rng.randint(0, 270))), "region": rng.choice(regions),
+                            "product": rng.choice(products), "units": units, "saleprice": price, "total_revenue": units * price})
+        connection.execute(text("INSERT INTO sales_data VALUES (:orderid, :orderdate, :region, :product, :units, :saleprice, :total_revenue)"), records)
+        connection.commit()
+
+def generate_pdf(pages: int) -> bytes:
+    """Renders a small quarterly-report style PDF to upload."""
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, PageBreak
+    from reportlab.lib.styles import getSampleStyleSheet
+    rng = random.Random(7)
+    styles, story, buffer = getSampleStyleSheet(), [], io.BytesIO()
+    for page in range(pages):
+        story.append(Paragraph(f"Q3 2025 Report - Section {page + 1}", styles['h2']))
+        for _ in range(6):
+            growth = rng.randint(-5, 25)
+            story.append(Paragraph(f"Revenue in the {rng.choice(['North', 'South', 'East', 'West'])} region grew {growth}% quarter over quarter. "
+                                   f"The CEO noted that {rng.choice(['supply costs', 'new product lines', 'hiring', 'currency effects'])} shaped the result. " * 3, styles['BodyText']))
+        story.append(PageBreak())
+    SimpleDocTemplate(buffer).build(story)
+    return buffer.getvalue()
+
+def build_in_process_client(args) -> httpx.AsyncClient:
+    """Configures the app for offline use and returns a client bound to it in-process."""
+    workdir = tempfile.mkdtemp(prefix="insightgpt_bench_")
+    db_path = os.path.join(workdir, "bench.db")
+    generate_sales_db(db_path, args.rows)
+    os.environ.update({
+        "LLM_PROVIDER": "fake", "EMBEDDING_PROVIDER": "fake", "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "DATABASE_URL": f"sqlite:///{db_path}", "VECTOR_INDEX_DIR": os.path.join(workdir, "vector_index"),
+        "JWT_SECRET_KEY": "bench-secret", "JWT_ALGORITHM": "HS256",
+    })
+    os.environ.setdefault("REDIS_HOST", "localhost"); os.environ.setdefault("REDIS_PORT", "6379")
+    import fakeredis
+    from app.core.registry import registry
+    from app.main import app
+    registry.override("redis", fakeredis.FakeRedis(decode_responses=True))
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=args.timeout)
+
+async def timed_request(results: list, label: str, coro):
+    start = time.perf_counter()
+    try:
+        response = await coro
+        ok = response.status_code < 400
+    except httpx.HTTPError:
+        response, ok = None, False
+    results.append((label, (time.perf_counter() - start) * 1000, ok))
+    return response
+
+async def virtual_user(client: httpx.AsyncClient, index: int, deadline: float, pdf_bytes: bytes, results: list):
+    rng = random.Random(index)
+    username, password = f"bench_user_{index}_{int(time.time())}", "bench-password"
+    await client.post("/register", json={"username": username, "password": password})
+    login = await client.post("/token", data={"username": username, "password": password})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    history, session_id = [], None
+    labels, weights = list(SCENARIO_WEIGHTS), list(SCENARIO_WEIGHTS.values())
+    while time.perf_counter() < deadline:
+        label = rng.choices(labels, weights)[0]
+        if label == "query":
+            question = rng.choice(QUESTIONS)
+            response = await timed_request(results, label, client.post("/query", headers=headers, json={"query": question}))
+            if response is not None and response.status_code == 200:
+                history += [{"role": "user", "content": question}, {"role": "assistant", "content": response.json()["answer"]}]
+        elif label == "save_session" and history:
+            if session_id:
+                await timed_request(results, label, client.put(f"/sessions/{session_id}", headers=headers, json={"chat_history": history}))
+            else:
+                response = await timed_request(results, label, client.post("/sessions", headers=headers, json={"chat_history": history}))
+                if response is not None and response.status_code == 200: session_id = response.json()["session_id"]
+        elif label == "get_session" and session_id:
+            await timed_request(results, label, client.get(f"/sessions/{session_id}", headers=headers))
+        elif label == "list_sessions":
+            await timed_request(results, label, client.get("/sessions", headers=headers))
+        elif label == "report" and history:
+            await timed_request(results, label, client.post("/report", headers=headers, json={"chat_history": history[-10:]}))
+        elif label == "upload":
+            files = {"file": (f"bench_{index}_{rng.randint(0, 10**9)}.pdf", pdf_bytes, "application/pdf")}
+            await timed_request(results, label, client.post("/upload", headers=headers, files=files))
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values: return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))]
+
+def summarise(results: list, duration: float) -> dict:
+    summary = {}
+    for label in sorted({label for label, _, _ in results}):
+        latencies = sorted(ms for l, ms, _ in results if l == label)
+        errors = sum(1 for l, _, ok in results if l == label and not ok)
+        summary[label] = {"requests": len(latencies), "errors": errors, "throughput_rps": round(len(latencies) / duration, 2),
+                          "p50_ms": round(percentile(latencies, 50), 1), "p95_ms": round(percentile(latencies, 95), 1), "p99_ms": round(percentile(latencies, 99), 1)}
+    return summary
+
+def print_summary(summary: dict, baseline: dict | None = None):
+    print(f"{'endpoint':<14}{'reqs':>7}{'errs':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for label, row in summary.items():
+        line = f"{label:<14}{row['requests']:>7}{row['errors']:>6}{row['throughput_rps']:>9}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        previous = (baseline or {}).get(label)
+        if previous and previous["p99_ms"]:
+            line += f"   p99 {100 * (row['p99_ms'] - previous['p99_ms']) / previous['p99_ms']:+.1f}% vs baseline"
+        print(line)
+
+async def check_scripted_paths(client: httpx.AsyncClient):
+    """Fails fast if the scripted LLM no longer reaches the SQL agent, which would leave the SQL and chart paths unmeasured."""
+    credentials = {"username": f"bench_smoke_{int(time.time())}", "password": "bench-password"}
+    await client.post("/register", json=credentials)
+    login = await client.post("/token", data=credentials)
+    response = await client.post("/query", headers={"Authorization": f"Bearer {login.json()['access_token']}"}, json={"query": CHART_QUESTION})
+    if response.status_code != 200 or not response.json().get("chart_json"):
+        raise SystemExit(f"Scripted chart question returned no chart_json ({response.status_code}): {response.text[:300]}")
+
+async def run(args) -> dict:
+    client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) if args.base_url else build_in_process_client(args)
+    pdf_bytes, results = generate_pdf(args.pdf_pages), []
+    async with client:
+        if not args.base_url: await check_scripted_paths(client)
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(virtual_user(client, i, deadline, pdf_bytes, results) for i in range(args.users)))
+        elapsed = time.perf_counter() - start
+    return {"config": vars(args), "duration_s": round(elapsed, 2), "endpoints": summarise(results, elapsed)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test for the InsightGPT Pro API.")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users.")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds to drive load for.")
+    parser.add_argument("--llm-latency-ms", type=float, default=50, help="Latency of each fake LLM call.")
+    parser.add_argument("--rows", type=int, default=5000, help="Generated sales_data rows.")
+    parser.add_argument("--pdf-pages", type=int, default=3, help="Pages in the generated upload PDF.")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--base-url", help="Target a running server instead of the in-process offline app.")
+    parser.add_argument("--output", help="Write results as JSON for later comparison.")
+    parser.add_argument("--compare", help="A previous results JSON to compare p99 latencies against.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    baseline = json.load(open(args.compare))["endpoints"] if args.compare else None
+    print(f"--- {args.users} users for {report['duration_s']}s ---")
+    print_summary(report["endpoints"], baseline)
+    if args.output:
+        with open(args.output, "w") as f: json.dump(report, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# scripts/bench_login_storm.py
+# Fires a burst of bcrypt logins while a probe stands in for /query traffic on the same
+# event loop, and reports how late the probe runs with inline vs offloaded verification.
+import os
+import sys
+import time
+import asyncio
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.core.security import verify_password, verify_password_async, get_password_hash, PasswordHashingBusy
+
+LOGINS = int(os.getenv("BENCH_LOGINS", 30))
+PROBE_INTERVAL = 0.005
+
+async def inline_login(password, hashed):
+    return verify_password(password, hashed)
+
+async def offloaded_login(password, hashed):
+    try:
+        return await verify_password_async(password, hashed)
+    except PasswordHashingBusy:
+        return False
+
+async def probe(stop: asyncio.Event, lateness: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lateness.append((time.perf_counter() - start - PROBE_INTERVAL) * 1000)
+
+async def run_storm(login_fn, hashed):
+    stop, lateness = asyncio.Event(), []
+    probe_task = asyncio.create_task(probe(stop, lateness))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await asyncio.gather(*(login_fn("bench-password", hashed) for _ in range(LOGINS)))
+    elapsed = time.perf_counter() - start
+    stop.set(); await probe_task
+    lateness.sort()
+    return elapsed, lateness[len(lateness) // 2], lateness[max(int(len(lateness) * 0.99) - 1, 0)]
+
+def main():
+    hashed = get_password_hash("bench-password")
+    print(f"--- Login storm of {LOGINS} bcrypt verifications ---")
+    for label, login_fn in (("inline", inline_login), ("offloaded", offloaded_login)):
+        elapsed, p50, p99 = asyncio.run(run_storm(login_fn, hashed))
+        print(f"{label:<10} storm={elapsed:6.2f}s  probe lateness p50={p50:7.1f}ms  p99={p99:7.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# scripts/bench_startup.py
+# Measures how long `import app.main` takes and, for a real uvicorn process, the time until
+# "/" answers (process is up) and until "/ready" reports warmup complete.
+#
+#   python scripts/bench_startup.py --fake --runs 3
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import app.main; print(time.perf_counter() - start)"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def status_of(url: str) -> int | None:
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response: return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, TimeoutError):
+        return None
+
+def measure_import(env: dict) -> float:
+    output = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(output.stdout.strip().splitlines()[-1])
+
+def measure_time_to_ready(env: dict, timeout: float) -> tuple[float | None, float | None]:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)], cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time_to_live = time_to_ready = None
+    try:
+        while time.perf_counter() - start < timeout and time_to_ready is None:
+            if time_to_live is None and status_of(f"{base}/") == 200: time_to_live = time.perf_counter() - start
+            if time_to_live is not None and status_of(f"{base}/ready") == 200: time_to_ready = time.perf_counter() - start
+            time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return time_to_live, time_to_ready
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup benchmark for the InsightGPT Pro API.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--fake", action="store_true", help="Use the fake LLM and embeddings so no model download or API key is needed.")
+    parser.add_argument("--output", help="Write results as JSON.")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.fake: env.update({"LLM_PROVIDER": "fake", "EMBEDDING_PROVIDER": "fake"})
+    env.setdefault("JWT_SECRET_KEY", "bench-secret"); env.setdefault("JWT_ALGORITHM", "HS256")
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    startups = [measure_time_to_ready(env, args.timeout) for _ in range(args.runs)]
+    live = [t for t, _ in startups if t is not None]
+    ready = [t for _, t in startups if t is not None]
+    results = {
+        "import_s": round(statistics.median(imports), 3),
+        "time_to_live_s": round(statistics.median(live), 3) if live else None,
+        "time_to_ready_s": round(statistics.median(ready), 3) if ready else None,
+        "runs": args.runs,
+    }
+    print(f"import app.main: {results['import_s']}s | '/' up after: {results['time_to_live_s']}s | '/ready' after: {results['time_to_ready_s']}s (median of {args.runs})")
+    if args.output:
+        with open(args.output, "w") as f: json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# scripts/bench_vector_index.py
+# Compares the exact flat index against the compressed index types from index_store on
+# recall@k, query latency, build time and memory, to choose VECTOR_INDEX_* settings with data.
+#
+#   python scripts/bench_vector_index.py --vectors 100000 --nprobe 4 8 16 32 --output index_bench.json
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import faiss
+import numpy as np
+from app.services import index_store
+
+def synthetic_corpus(n: int, dimension: int, clusters: int, seed: int) -> np.ndarray:
+    """Clustered, L2-normalised vectors that roughly mimic sentence-embedding structure."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimension)).astype("float32")
+    vectors = centres[rng.integers(0, clusters, n)] + 0.35 * rng.normal(size=(n, dimension)).astype("float32")
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def measure(label: str, index, queries: np.ndarray, truth: np.ndarray, k: int, build_s: float) -> dict:
+    index.search(queries[:10], k)
+    timings, found = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        timings.append((time.perf_counter() - start) * 1000)
+        found.append(ids[0])
+    recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+    timings.sort()
+    return {"index": label, f"recall@{k}": round(float(recall), 4), "p50_ms": round(timings[len(timings) // 2], 3),
+            "p99_ms": round(timings[int(len(timings) * 0.99) - 1], 3), "memory_mb": round(len(faiss.serialize_index(index)) / 2**20, 2), "build_s": round(build_s, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency vs memory for vector index types.")
+    parser.add_argument("--vectors", type=int, default=50000)
+    parser.add_argument("--dimension", type=int, default=384, help="all-MiniLM-L6-v2 produces 384-dim vectors.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=4, help="Matches the retriever's default k.")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 8, 16, 32, 64])
+    parser.add_argument("--modes", nargs="+", default=["sq8", "ivfsq8", "ivfpq"])
+    parser.add_argument("--output", help="Write results as JSON.")
+    args = parser.parse_args()
+
+    corpus = synthetic_corpus(args.vectors, args.dimension, clusters=max(8, args.vectors // 500), seed=0)
+    queries = synthetic_corpus(args.queries, args.dimension, clusters=max(8, args.vectors // 500), seed=1)
+
+    start = time.perf_counter()
+    flat = index_store.build_faiss_index(corpus, mode="flat")
+    flat_build = time.perf_counter() - start
+    _, truth = flat.search(queries, args.k)
+    results = [measure("Flat", flat, queries, truth, args.k, flat_build)]
+
+    for mode in args.modes:
+        start = time.perf_counter()
+        index = index_store.build_faiss_index(corpus, mode=mode)
+        build_s = time.perf_counter() - start
+        spec = index_store.index_spec(args.vectors, args.dimension, mode)
+        if spec.startswith("IVF"):
+            for nprobe in args.nprobe:
+                index_store.set_nprobe(index, nprobe)
+                results.append(measure(f"{spec} nprobe={nprobe}", index, queries, truth, args.k, build_s))
+        else:
+            results.append(measure(spec, index, queries, truth, args.k, build_s))
+
+    print(f"--- {args.vectors} x {args.dimension}-dim vectors, {args.queries} queries, k={args.k} ---")
+    print(f"{'index':<28}{'recall':>8}{'p50 ms':>9}{'p99 ms':>9}{'mem MB':>9}{'build s':>9}")
+    for row in results:
+        print(f"{row['index']:<28}{row[f'recall@{args.k}']:>8}{row['p50_ms']:>9}{row['p99_ms']:>9}{row['memory_mb']:>9}{row['build_s']:>9}")
+    if args.output:
+        with open(args.output, "w") as f: json.dump({"config": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,17 @@
 # scripts/process_docs.py
 import os
+import sys
 from dotenv import load_dotenv
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
 
 load_dotenv()
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.services import index_store
+
 PDF_FILE_PATH = os.path.join('data', 'quarterly_report.pdf')
-FAISS_INDEX_PATH = os.path.join('data', 'faiss_index')
 
 def main():
     if not os.path.exists(PDF_FILE_PATH):
@@ -30,10 +32,11 @@ def main():
     embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
 
     print("Creating FAISS vector store...")
-    db = FAISS.from_documents(docs, embeddings)
+    db = index_store.build_vector_store(docs, embeddings)
 
-    print(f"Saving FAISS index to: {FAISS_INDEX_PATH}")
-    db.save_local(FAISS_INDEX_PATH)
+    # Running API workers pick the new version up on their next poll.
+    print(f"Publishing FAISS index to: {index_store.INDEX_ROOT}")
+    index_store.publish(db)
 
     print("--- ✅ Document Processing Complete ---")
 